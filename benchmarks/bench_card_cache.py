@@ -0,0 +1,59 @@
+"""List render time with the card cache as a share of the rows change.
+
+Usage: python -m benchmarks.bench_card_cache [--rows 200] [--rounds 200]
+           [--changed 0,1,10,100] [--json PATH]
+
+Each round bumps the version of --changed percent of the recipes, as the
+patch handler does, then renders the whole grid. Only the bumped cards
+miss; the rest are joined from the cache. Reports the mean render time
+and the cache's hit ratio for each share, next to a render with the
+cache emptied every round.
+"""
+import argparse, random, time
+
+from utils import card_cache, generate_html as gen_html
+from benchmarks import results
+from benchmarks.bench_generate_html import make_rows
+
+def render_rounds(recipes, rounds: int, changed: float | None, rng: random.Random):
+    card_cache.clear()
+    "".join(gen_html.generate_recipes(recipes))
+    before = card_cache.stats()
+    elapsed = 0.0
+    for _ in range(rounds):
+        if changed is None:
+            card_cache.clear()
+        else:
+            for recipe in rng.sample(recipes, round(len(recipes) * changed)):
+                recipe.version += 1
+        start = time.perf_counter()
+        "".join(gen_html.generate_recipes(recipes))
+        elapsed += time.perf_counter() - start
+    after = card_cache.stats()
+    hits, misses = after["hits"] - before["hits"], after["misses"] - before["misses"]
+    return elapsed / rounds, hits / (hits + misses)
+
+def run(rows: int, rounds: int, shares: list[float]):
+    rng = random.Random(1)
+    recipes = make_rows(rows)[2]
+    measured = []
+    for name, changed in [("no cache", None)] + [(f"{share:g}% changed", share / 100) for share in shares]:
+        mean, hit_ratio = render_rounds(recipes, rounds, changed, rng)
+        measured.append({"name": name, "per_second": 1 / mean, "mean_us": mean * 1e6, "hit_ratio": hit_ratio})
+    return measured
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=200)
+    parser.add_argument("--rounds", type=int, default=200)
+    parser.add_argument("--changed", default="0,1,10,100", help="comma-separated percentages of rows to bump per round")
+    parser.add_argument("--json", help="write the results to this file")
+    args = parser.parse_args()
+
+    measured = run(args.rows, args.rounds, [float(share) for share in args.changed.split(",")])
+    print(f"{'rows changed':<16}{'renders/s':>12}{'mean us':>12}{'hit ratio':>12}")
+    for result in measured:
+        print(f"{result['name']:<16}{result['per_second']:>12.1f}{result['mean_us']:>12.1f}{result['hit_ratio']:>12.3f}")
+    print(f"cache: {card_cache.stats()}")
+    if args.json:
+        results.save(args.json, "card_cache", vars(args), measured)
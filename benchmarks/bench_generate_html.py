@@ -0,0 +1,93 @@
+"""Render throughput of utils/generate_html against the old f-string renderers.
+
+Usage: python -m benchmarks.bench_generate_html [--rows 200] [--seconds 2]
+           [--max-slowdown 2.5]
+
+The card cache is turned off, so every card is rendered on every call.
+The f-strings escaped nothing, so the templates are expected to be slower;
+the accepted cost is --max-slowdown, and the script exits non-zero if the
+grid renderers, the hot loop of every listing page, fall behind it.
+"""
+import argparse, sys, time
+
+from models import (
+    tag as tag_model,
+    cuisine as cuisine_model,
+    recipe as recipe_model,
+    review as review_model
+)
+from utils import card_cache, reference, generate_html as gen_html
+from benchmarks import legacy_generate_html as legacy_html
+
+INGREDIENTS_HTML = "<table><thead><tr><th>Amount</th><th>Ingredient</th></tr></thead><tbody>" + \
+    "<tr><td>1 cup</td><td>rice noodles</td></tr>" * 8 + "</tbody></table>"
+INSTRUCTIONS_HTML = "<ol>" + "<li>Stir everything together and cook until done.</li>" * 8 + "</ol>"
+
+def make_rows(count: int):
+    tags = [tag_model.Tag(id=i, name=f"tag {i}") for i in range(1, 9)]
+    cuisines = [cuisine_model.Cuisine(id=i, name=f"cuisine {i}") for i in range(1, 9)]
+    # the card renderers take the names from here, not the relationships
+    reference.tags.set_all((tag.id, tag.name) for tag in tags)
+    reference.cuisines.set_all((cuisine.id, cuisine.name) for cuisine in cuisines)
+    recipes = [
+        recipe_model.Recipe(
+            id=i, name=f"Recipe number {i}", servings=4, calories=450 + i, protein=30,
+            tag_id=tags[i % len(tags)].id, tag=tags[i % len(tags)],
+            ingredients_html=INGREDIENTS_HTML, instructions_html=INSTRUCTIONS_HTML,
+        )
+        for i in range(count)
+    ]
+    reviews = [
+        review_model.Review(
+            id=i, name=f"Restaurant {i}", address=f"{i} Main Street", visited=bool(i % 2),
+            rating=i % 6, notes="Great noodles, slow service.",
+            cuisine_id=cuisines[i % len(cuisines)].id, cuisine=cuisines[i % len(cuisines)],
+        )
+        for i in range(count)
+    ]
+    return tags, cuisines, recipes, reviews
+
+GRID_FUNCTIONS = ("generate_recipes", "generate_reviews")
+
+def measure(render, seconds: float):
+    calls, size = 0, 0
+    start = time.perf_counter()
+    while time.perf_counter() - start < seconds:
+        size = len(render())
+        calls += 1
+    elapsed = time.perf_counter() - start
+    return calls / elapsed, size
+
+def cases(rows):
+    tags, cuisines, recipes, reviews = rows
+    for module_name, module in (("f-string", legacy_html), ("jinja2", gen_html)):
+        yield "generate_tags", module_name, lambda module=module: module.generate_tags(tags)
+        yield "generate_cuisines", module_name, lambda module=module: module.generate_cuisines(cuisines)
+        yield "generate_recipes", module_name, lambda module=module: "".join(module.generate_recipes(recipes))
+        yield "generate_reviews", module_name, lambda module=module: "".join(module.generate_reviews(reviews))
+        yield "generate_recipe", module_name, lambda module=module: module.generate_recipe(recipes[0])
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=200)
+    parser.add_argument("--seconds", type=float, default=2.0)
+    parser.add_argument("--max-slowdown", type=float, default=2.5,
+                        help="f-string renders/s over jinja2 renders/s allowed for the grids")
+    args = parser.parse_args()
+
+    card_cache.CARD_CACHE_MAX_BYTES = 0
+    rows = make_rows(args.rows)
+    rates = {}
+    print(f"{'function':<20}{'renderer':<10}{'renders/s':>12}{'bytes':>10}")
+    for function, renderer, render in sorted(cases(rows), key=lambda case: case[0]):
+        rate, size = measure(render, args.seconds)
+        rates[function, renderer] = rate
+        print(f"{function:<20}{renderer:<10}{rate:>12.1f}{size:>10}")
+
+    over = []
+    for function in GRID_FUNCTIONS:
+        slowdown = rates[function, "f-string"] / rates[function, "jinja2"]
+        print(f"{function} slowdown: {slowdown:.2f}x (accepted up to {args.max_slowdown:.2f}x)")
+        if slowdown > args.max_slowdown:
+            over.append(function)
+    sys.exit(1 if over else 0)
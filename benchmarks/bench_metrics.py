@@ -0,0 +1,86 @@
+"""Overhead of the metrics and profiling instrumentation.
+
+Usage: python -m benchmarks.bench_metrics [--calls 50000] [--json PATH]
+
+Times the same work with and without each piece of instrumentation: the
+metrics and profiling middleware around a bare ASGI app, the engine
+events around a trivial SQLite statement, and the render wrapper around
+a cheap function. The difference is the cost per request, per statement
+and per render call. The profiler's log lines are not written here.
+"""
+import argparse, asyncio, time
+from sqlalchemy import create_engine, text
+
+from utils import metrics, profiling
+from benchmarks import results
+
+class Route:
+    path = "/bench/{item_id}"
+
+async def bare_app(scope, receive, send):
+    scope["route"] = Route
+    await send({"type": "http.response.start", "status": 200, "headers": []})
+    await send({"type": "http.response.body", "body": b"ok"})
+
+async def call_app(app, calls: int):
+    async def receive():
+        return {"type": "http.request", "body": b""}
+
+    async def send(message):
+        pass
+
+    start = time.perf_counter()
+    for _ in range(calls):
+        await app({"type": "http", "method": "GET", "path": "/bench/1"}, receive, send)
+    return (time.perf_counter() - start) / calls
+
+def call_engine(engine, calls: int):
+    with engine.connect() as conn:
+        start = time.perf_counter()
+        for _ in range(calls):
+            conn.execute(text("SELECT 1")).scalar()
+        return (time.perf_counter() - start) / calls
+
+def call_render(render, calls: int):
+    start = time.perf_counter()
+    for _ in range(calls):
+        render("x")
+    return (time.perf_counter() - start) / calls
+
+def run(calls: int):
+    def render(value):
+        return value * 2
+
+    bare_engine = create_engine("sqlite://")
+    instrumented_engine = create_engine("sqlite://")
+    metrics.instrument_engine(instrumented_engine, "bench")
+
+    profiling.logger.setLevel("ERROR")
+    bare = asyncio.run(call_app(bare_app, calls))
+    pairs = [
+        ("metrics middleware per request", bare, asyncio.run(call_app(metrics.MetricsMiddleware(bare_app), calls))),
+        ("profiler, request not sampled", bare, asyncio.run(call_app(profiling.ProfilingMiddleware(bare_app, 0.0), calls))),
+        ("profiler, request sampled", bare, asyncio.run(call_app(profiling.ProfilingMiddleware(bare_app, 1.0), calls))),
+        ("engine events per statement",
+            call_engine(bare_engine, calls), call_engine(instrumented_engine, calls)),
+        ("render wrapper per call",
+            call_render(render, calls), call_render(metrics.timed_render(render), calls)),
+    ]
+    return [
+        {"name": name, "per_second": 1 / instrumented, "bare_us": bare * 1e6,
+         "instrumented_us": instrumented * 1e6, "overhead_us": (instrumented - bare) * 1e6}
+        for name, bare, instrumented in pairs
+    ]
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--calls", type=int, default=50000)
+    parser.add_argument("--json", help="write the results to this file")
+    args = parser.parse_args()
+
+    measured = run(args.calls)
+    print(f"{'instrumentation':<32}{'bare us':>10}{'with us':>10}{'overhead us':>13}")
+    for result in measured:
+        print(f"{result['name']:<32}{result['bare_us']:>10.2f}{result['instrumented_us']:>10.2f}{result['overhead_us']:>13.2f}")
+    if args.json:
+        results.save(args.json, "metrics", vars(args), measured)
@@ -0,0 +1,80 @@
+"""Micro-benchmarks for every generate_html function and for auth_util.
+
+Usage: python -m benchmarks.bench_micro [--rows 200] [--seconds 1] [--json PATH]
+
+The grid renderers are measured over --rows cards per call, once with
+every card served from the card cache and once with it emptied first. Password
+hashing and verification go through bcrypt directly, without the hash
+pool, so the numbers are per core.
+"""
+import argparse, asyncio, os, time
+
+os.environ.setdefault("SECRET_KEY", "benchmark-secret-key-benchmark-secret")
+os.environ.setdefault("ALGORITHM", "HS256")
+os.environ.setdefault("ACCESS_TOKEN_EXPIRE_MINUTES", "30")
+
+from utils import (
+    auth_util as auth_util,
+    card_cache as card_cache,
+    generate_html as gen_html
+)
+from benchmarks import results
+from benchmarks.bench_generate_html import make_rows
+
+def per_second(call, seconds: float):
+    calls = 0
+    start = time.perf_counter()
+    while time.perf_counter() - start < seconds:
+        call()
+        calls += 1
+    return calls / (time.perf_counter() - start)
+
+def generate_html_cases(rows):
+    tags, cuisines, recipes, reviews = rows
+    yield "generate_slug", lambda: gen_html.generate_slug(recipes[0].name)
+    yield "generate_stars", lambda: gen_html.generate_stars(4)
+    yield "generate_tags", lambda: gen_html.generate_tags(tags)
+    yield "generate_cuisines", lambda: gen_html.generate_cuisines(cuisines)
+    yield "generate_recipes", lambda: "".join(gen_html.generate_recipes(recipes))
+    yield "generate_reviews", lambda: "".join(gen_html.generate_reviews(reviews))
+    yield "generate_recipes (cold)", lambda: (card_cache.clear(), "".join(gen_html.generate_recipes(recipes)))
+    yield "generate_reviews (cold)", lambda: (card_cache.clear(), "".join(gen_html.generate_reviews(reviews)))
+    yield "generate_error_html", lambda: gen_html.generate_error_html()
+    yield "generate_recipe", lambda: gen_html.generate_recipe(recipes[0])
+
+def auth_util_cases(loop: asyncio.AbstractEventLoop):
+    hashed = auth_util.encrypt_password("correct horse")
+    token = auth_util.generate_token("bench")
+    yield "encrypt_password", lambda: auth_util.encrypt_password("correct horse")
+    yield "verify_password", lambda: auth_util.verify_password("correct horse", hashed)
+    yield "generate_token", lambda: auth_util.generate_token("bench")
+    yield "decode_token", lambda: auth_util.decode_token(token)
+    # every call after the first is a token cache hit; the event loop
+    # round trip is included
+    yield "verify_token", lambda: loop.run_until_complete(auth_util.verify_token(token))
+
+def run(rows: int, seconds: float):
+    loop = asyncio.new_event_loop()
+    cases = [("generate_html." + name, render) for name, render in generate_html_cases(make_rows(rows))]
+    cases += [("auth_util." + name, call) for name, call in auth_util_cases(loop)]
+
+    measured = []
+    for name, call in cases:
+        rate = per_second(call, seconds)
+        measured.append({"name": name, "per_second": rate, "mean_us": 1e6 / rate})
+    loop.close()
+    return measured
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=200)
+    parser.add_argument("--seconds", type=float, default=1.0)
+    parser.add_argument("--json", help="write the results to this file")
+    args = parser.parse_args()
+
+    measured = run(args.rows, args.seconds)
+    print(f"{'benchmark':<36}{'calls/s':>12}{'mean us':>12}")
+    for result in measured:
+        print(f"{result['name']:<36}{result['per_second']:>12.1f}{result['mean_us']:>12.1f}")
+    if args.json:
+        results.save(args.json, "micro", vars(args), measured)
@@ -0,0 +1,212 @@
+"""Load-test every route in routers/ in-process at a fixed concurrency.
+
+Usage: python -m benchmarks.bench_routes [--requests 200] [--concurrency 8]
+           [--only SUBSTRING] [--json PATH] [--database PATH]
+
+Requests go through httpx's ASGITransport straight into the app, so the
+numbers include middleware, validation, the database and rendering, but
+no sockets. By default it runs against a throwaway database seeded with
+the default sizes. --database points it at an existing file instead, which
+is seeded first if empty; the create, patch and delete routes write to it.
+"""
+import argparse, asyncio, json, os, statistics, tempfile, time
+
+# read before the app is imported, since the database path is fixed then
+_database = argparse.ArgumentParser(add_help=False)
+_database.add_argument("--database")
+os.environ["DATABASE_FILE"] = (_database.parse_known_args()[0].database
+                               or os.path.join(tempfile.mkdtemp(), "database.db"))
+
+os.environ.setdefault("SECRET_KEY", "benchmark-secret-key-benchmark-secret")
+os.environ.setdefault("ALGORITHM", "HS256")
+os.environ.setdefault("ACCESS_TOKEN_EXPIRE_MINUTES", "30")
+# the login route is measured like every other route, not throttled
+os.environ.setdefault("LOGIN_ATTEMPTS_PER_USER", "1000000000")
+os.environ.setdefault("LOGIN_ATTEMPTS_PER_IP", "1000000000")
+
+import httpx
+from fastapi.routing import APIRoute
+from sqlalchemy import func
+from sqlmodel import Session, select
+
+import main, migrations
+from database import engine
+from models import (
+    change as change_model,
+    recipe as recipe_model,
+    review as review_model,
+    tag as tag_model,
+    cuisine as cuisine_model
+)
+from utils import auth_util
+from benchmarks import results
+from scripts import seed as seed_script
+
+def percentile(latencies: list[float], percent: int):
+    if len(latencies) < 2:
+        return latencies[0] if latencies else 0.0
+    return statistics.quantiles(latencies, n=100, method="inclusive")[percent - 1]
+
+def sample_ids():
+    with engine.begin() as conn:
+        migrations.migrate(conn)
+    with Session(engine) as session:
+        if session.exec(select(recipe_model.Recipe.id).limit(1)).first() is None:
+            seed_script.seed()
+        return {
+            "recipe": session.exec(select(recipe_model.Recipe.id).limit(1)).one(),
+            "review": session.exec(select(review_model.Review.id).limit(1)).one(),
+            "recipe_slug": session.exec(select(recipe_model.Recipe.slug).where(recipe_model.Recipe.slug != None).limit(1)).one(),
+            "review_slug": session.exec(select(review_model.Review.slug).where(review_model.Review.slug != None).limit(1)).one(),
+            "tag": session.exec(select(tag_model.Tag.id).limit(1)).one(),
+            "cuisine": session.exec(select(cuisine_model.Cuisine.id).limit(1)).one(),
+            "change": session.exec(select(func.max(change_model.Change.id))).one() or 0,
+        }
+
+def new_recipe(i: int, tag_id: int):
+    return {"name": f"Benchmark Noodles {i}", "servings": 2, "calories": 640, "protein": 31, "tag_id": tag_id,
+            "ingredients": "| Amount | Ingredient |\n| --- | --- |\n| 1 cup | rice noodles |",
+            "instructions": "1. Boil the noodles.\n2. Toss with the sauce."}
+
+def new_review(i: int, cuisine_id: int):
+    return {"name": f"Benchmark Kitchen {i}", "address": "1 Main Street", "visited": True, "rating": 4,
+            "notes": "Benchmark row.", "cuisine_id": cuisine_id}
+
+def ndjson(rows):
+    return "".join(json.dumps(row) + "\n" for row in rows).encode("utf-8")
+
+async def create_many(client: httpx.AsyncClient, path: str, bodies, headers: dict):
+    ids = []
+    for body in bodies:
+        response = await client.post(path, json=body, headers=headers)
+        ids.append(response.json()["id"])
+    return ids
+
+def cases(ids: dict, headers: dict, requests: int):
+    """(method, route path, setup, request) for every benchmarked route.
+
+    setup runs once, untimed, and returns state for request(i, state),
+    which returns the url and the httpx keyword arguments for request i.
+    """
+    recipe, review, tag, cuisine = ids["recipe"], ids["review"], ids["tag"], ids["cuisine"]
+    auth = {"headers": headers}
+    get = lambda url, **kwargs: (lambda i, state: (url, kwargs))
+    yield "POST", "/auth/token", None, lambda i, state: ("/auth/token", {"data": {"username": seed_script.BENCH_USER, "password": seed_script.BENCH_PASSWORD}})
+    yield "GET", "/auth/me", None, get("/auth/me", **auth)
+
+    yield "POST", "/recipes/create/", None, lambda i, state: ("/recipes/create/", {"json": new_recipe(i, tag), **auth})
+    yield "GET", "/recipes/all/", None, get("/recipes/all/?limit=50")
+    yield "GET", "/recipes/search", None, get("/recipes/search?q=noodles")
+    yield "GET", "/recipes/search/html", None, get("/recipes/search/html?q=noodles")
+    yield "POST", "/recipes/import", None, lambda i, state: ("/recipes/import", {"content": ndjson(new_recipe(f"{i}-{n}", tag) for n in range(10)), **auth})
+    yield "GET", "/recipes/export", None, get("/recipes/export", **auth)
+    yield "GET", "/recipes/by-slug/{slug}", None, get(f"/recipes/by-slug/{ids['recipe_slug']}")
+    yield "GET", "/recipes/by-slug/{slug}/html", None, get(f"/recipes/by-slug/{ids['recipe_slug']}/html")
+    yield "GET", "/recipes/{recipe_id}", None, get(f"/recipes/{recipe}")
+    yield "PATCH", "/recipes/{recipe_id}", None, lambda i, state: (f"/recipes/{recipe}", {"json": {"servings": 1 + i % 6}, **auth})
+    yield ("DELETE", "/recipes/{recipe_id}",
+        lambda client: create_many(client, "/recipes/create/", (new_recipe(i, tag) for i in range(requests)), headers),
+        lambda i, state: (f"/recipes/{state[i]}", auth))
+    yield "GET", "/recipes/all/html", None, get("/recipes/all/html")
+    yield "GET", "/recipes/facets", None, get(f"/recipes/facets?tag={tag}&calories_max=600")
+    yield "GET", "/recipes/one/html", None, get(f"/recipes/one/html?id={recipe}")
+    yield "POST", "/recipes/tag", None, lambda i, state: ("/recipes/tag", {"json": {"name": f"benchmark {i}"}, **auth})
+    yield "GET", "/recipes/tags/", None, get("/recipes/tags/")
+    yield ("DELETE", "/recipes/tag/{tag_id}",
+        lambda client: create_many(client, "/recipes/tag", ({"name": f"doomed {i}"} for i in range(requests)), headers),
+        lambda i, state: (f"/recipes/tag/{state[i]}", auth))
+    yield "GET", "/recipes/tags/html", None, get("/recipes/tags/html")
+
+    yield "POST", "/reviews/create/", None, lambda i, state: ("/reviews/create/", {"json": new_review(i, cuisine), **auth})
+    yield "GET", "/reviews/all/", None, get("/reviews/all/?limit=50")
+    yield "GET", "/reviews/search", None, get("/reviews/search?q=kitchen")
+    yield "GET", "/reviews/search/html", None, get("/reviews/search/html?q=kitchen")
+    yield "POST", "/reviews/import", None, lambda i, state: ("/reviews/import", {"content": ndjson(new_review(f"{i}-{n}", cuisine) for n in range(10)), **auth})
+    yield "GET", "/reviews/export", None, get("/reviews/export", **auth)
+    yield "GET", "/reviews/by-slug/{slug}", None, get(f"/reviews/by-slug/{ids['review_slug']}")
+    yield "GET", "/reviews/{review_id}", None, get(f"/reviews/{review}")
+    yield "PATCH", "/reviews/{review_id}", None, lambda i, state: (f"/reviews/{review}", {"json": {"rating": i % 6}, **auth})
+    yield ("DELETE", "/reviews/{review_id}",
+        lambda client: create_many(client, "/reviews/create/", (new_review(i, cuisine) for i in range(requests)), headers),
+        lambda i, state: (f"/reviews/{state[i]}", auth))
+    yield "GET", "/reviews/all/html", None, get("/reviews/all/html")
+    yield "POST", "/reviews/cuisine", None, lambda i, state: ("/reviews/cuisine", {"json": {"name": f"benchmark {i}"}, **auth})
+    yield "GET", "/reviews/cuisines/", None, get("/reviews/cuisines/")
+    yield ("DELETE", "/reviews/cuisine/{cuisine_id}",
+        lambda client: create_many(client, "/reviews/cuisine", ({"name": f"doomed {i}"} for i in range(requests)), headers),
+        lambda i, state: (f"/reviews/cuisine/{state[i]}", auth))
+    yield "GET", "/reviews/cuisines/html", None, get("/reviews/cuisines/html")
+
+    # a client 100 changes behind, as a poll would be; the stream is never
+    # done, so it isn't a request to time
+    yield "GET", "/changes", None, get(f"/changes?since={max(ids['change'] - 100, 0)}")
+
+def app_routes():
+    for route in main.app.routes:
+        if isinstance(route, APIRoute) and route.endpoint.__module__.startswith("routers."):
+            for method in route.methods:
+                yield method, route.path
+
+async def run_case(client: httpx.AsyncClient, method: str, request, state, requests: int, concurrency: int):
+    latencies, statuses = [], {}
+    next_request = iter(range(requests))
+
+    async def worker():
+        for i in next_request:
+            url, kwargs = request(i, state)
+            start = time.perf_counter()
+            response = await client.request(method, url, **kwargs)
+            latencies.append(time.perf_counter() - start)
+            statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    return latencies, statuses, elapsed
+
+async def run(requests: int, concurrency: int, only: str | None = None):
+    ids = sample_ids()
+    headers = {"Authorization": "Bearer " + auth_util.generate_token(seed_script.BENCH_USER)}
+    selected = [case for case in cases(ids, headers, requests) if not only or only in f"{case[0]} {case[1]}"]
+
+    covered = {(method, path) for method, path, _, _ in cases(ids, headers, requests)}
+    uncovered = sorted(set(app_routes()) - covered)
+
+    measured = []
+    transport = httpx.ASGITransport(app=main.app)
+    async with main.app.router.lifespan_context(main.app):
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            for method, path, setup, request in selected:
+                state = await setup(client) if setup else None
+                latencies, statuses, elapsed = await run_case(client, method, request, state, requests, concurrency)
+                measured.append({
+                    "name": f"{method} {path}",
+                    "requests": requests,
+                    "concurrency": concurrency,
+                    "per_second": requests / elapsed,
+                    "p50_ms": percentile(latencies, 50) * 1000,
+                    "p95_ms": percentile(latencies, 95) * 1000,
+                    "p99_ms": percentile(latencies, 99) * 1000,
+                    "errors": sum(count for status, count in statuses.items() if status >= 400),
+                    "statuses": {str(status): count for status, count in sorted(statuses.items())},
+                })
+    return measured, uncovered
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=200, help="requests per route")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--only", help="only routes whose 'METHOD /path' contains this")
+    parser.add_argument("--json", help="write the results to this file")
+    parser.add_argument("--database", help="run against this database file, writes included")
+    args = parser.parse_args()
+
+    measured, uncovered = asyncio.run(run(args.requests, args.concurrency, args.only))
+    print(f"{'route':<36}{'req/s':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'errors':>8}")
+    for result in measured:
+        print(f"{result['name']:<36}{result['per_second']:>10.1f}{result['p50_ms']:>10.2f}"
+              f"{result['p95_ms']:>10.2f}{result['p99_ms']:>10.2f}{result['errors']:>8}")
+    for method, path in uncovered:
+        print(f"not benchmarked: {method} {path}")
+    if args.json:
+        results.save(args.json, "routes", vars(args), measured)
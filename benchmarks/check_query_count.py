@@ -0,0 +1,81 @@
+"""Check that the listing routes run the same number of queries for 1 row as for N.
+
+Usage: python -m benchmarks.check_query_count [--rows 50]
+
+Seeds a throwaway database with one recipe and review, counts the SQL
+statements each listing route executes, then reseeds with --rows of each
+and counts again. A relationship that is lazy-loaded per row shows up as
+a count that grows with the rows; the script exits non-zero if any route's
+count differs. --rows should stay within one stream batch, since the
+streamed grids fetch one batch per statement.
+"""
+import argparse, asyncio, os, sys, tempfile
+
+os.environ["DATABASE_FILE"] = os.path.join(tempfile.mkdtemp(), "database.db")
+os.environ.setdefault("SECRET_KEY", "benchmark-secret-key-benchmark-secret")
+os.environ.setdefault("ALGORITHM", "HS256")
+os.environ.setdefault("ACCESS_TOKEN_EXPIRE_MINUTES", "30")
+
+import httpx
+from sqlalchemy import event
+
+import main, migrations
+from database import engine, reader_engine, writer_engine
+from utils import card_cache, html_cache
+from scripts import seed as seed_script
+
+ROUTES = [
+    "/recipes/all/",
+    "/recipes/all/html",
+    "/recipes/all/html?limit=100",
+    "/recipes/one/html?id=1",
+    "/reviews/all/",
+    "/reviews/all/html",
+    "/reviews/all/html?limit=100",
+]
+
+statements = 0
+
+def count_statements(conn, cursor, statement, parameters, context, executemany):
+    global statements
+    statements += 1
+
+async def count(client: httpx.AsyncClient, url: str):
+    global statements
+    # every request has to render from the database, not a cache
+    html_cache.clear()
+    card_cache.clear()
+    statements = 0
+    response = await client.get(url)
+    response.raise_for_status()
+    return statements
+
+async def measure(rows: int):
+    seed_script.seed(tags=2, cuisines=2, recipes=rows, reviews=rows, reset=True)
+    counts = {}
+    async with main.app.router.lifespan_context(main.app):
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=main.app), base_url="http://check") as client:
+            for url in ROUTES:
+                # the first request on a fresh connection also runs the
+                # dialect's setup queries, so only the second one counts
+                await count(client, url)
+                counts[url] = await count(client, url)
+    return counts
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=50)
+    args = parser.parse_args()
+
+    with engine.begin() as conn:
+        migrations.migrate(conn)
+    for sync_engine in (reader_engine.sync_engine, writer_engine.sync_engine):
+        event.listen(sync_engine, "before_cursor_execute", count_statements)
+
+    one = asyncio.run(measure(1))
+    many = asyncio.run(measure(args.rows))
+    print(f"{'route':<32}{'1 row':>8}{f'{args.rows} rows':>10}")
+    for url in ROUTES:
+        flag = "" if one[url] == many[url] else "  <- grows with rows"
+        print(f"{url:<32}{one[url]:>8}{many[url]:>10}{flag}")
+    sys.exit(0 if one == many else 1)
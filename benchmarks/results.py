@@ -0,0 +1,58 @@
+"""Save benchmark results as JSON and compare two saved runs.
+
+Usage: python -m benchmarks.results BASELINE.json CURRENT.json [--threshold 10]
+
+Exits non-zero if any benchmark present in both runs got slower than the
+threshold, in percent of throughput.
+"""
+import argparse, json, platform, subprocess, sys, time
+from pathlib import Path
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def save(path: str, suite: str, config: dict, results: list[dict]):
+    document = {
+        "suite": suite,
+        "commit": git_commit(),
+        "created": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "config": config,
+        "results": results,
+    }
+    Path(path).parent.mkdir(parents=True, exist_ok=True)
+    Path(path).write_text(json.dumps(document, indent=2), encoding="utf-8")
+
+def load(path: str):
+    document = json.loads(Path(path).read_text(encoding="utf-8"))
+    return document, {result["name"]: result for result in document["results"]}
+
+def compare(baseline_path: str, current_path: str, threshold: float):
+    baseline, before = load(baseline_path)
+    current, after = load(current_path)
+    print(f"{baseline.get('commit')} -> {current.get('commit')}")
+    print(f"{'benchmark':<44}{'before/s':>12}{'after/s':>12}{'change':>9}")
+    regressions = []
+    for name in sorted(before.keys() & after.keys()):
+        old, new = before[name]["per_second"], after[name]["per_second"]
+        change = (new - old) / old * 100 if old else 0.0
+        line = f"{name:<44}{old:>12.1f}{new:>12.1f}{change:>8.1f}%"
+        if change < -threshold:
+            regressions.append(name)
+            line += "  slower"
+        print(line)
+    for name in sorted(before.keys() ^ after.keys()):
+        print(f"{name:<44}only in {'baseline' if name in before else 'current'}")
+    return regressions
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("baseline")
+    parser.add_argument("current")
+    parser.add_argument("--threshold", type=float, default=10.0, help="allowed slowdown in percent")
+    args = parser.parse_args()
+    sys.exit(1 if compare(args.baseline, args.current, args.threshold) else 0)
@@ -1,21 +1,62 @@
 from typing import Annotated
-from sqlmodel import SQLModel, Session, create_engine
+from sqlmodel import create_engine
+from sqlmodel.ext.asyncio.session import AsyncSession
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy.pool import AsyncAdaptedQueuePool
 from fastapi import Depends
 from fastapi.security import OAuth2PasswordBearer
 
-sqlite_file_name = "database.db"
+import db_config, migrations
+from utils import metrics
+
+sqlite_file_name = db_config.DATABASE_FILE
 sqlite_url = f"sqlite:///{sqlite_file_name}"
+async_sqlite_url = f"sqlite+aiosqlite:///{sqlite_file_name}"
 
 connect_args = {"check_same_thread": False}
-engine = create_engine(sqlite_url, connect_args=connect_args)
+# the synchronous engine is only used by the command line tools in scripts/
+engine = db_config.apply_pragmas(create_engine(sqlite_url, connect_args=connect_args))
+
+# SQLite allows a single writer at a time, so mutations share one
+# connection and queue in the pool instead of on the database lock, while
+# WAL lets the reader pool keep serving GETs during a write
+writer_engine = create_async_engine(
+    async_sqlite_url,
+    poolclass=AsyncAdaptedQueuePool,
+    pool_size=1,
+    max_overflow=0,
+)
+reader_engine = create_async_engine(
+    async_sqlite_url,
+    poolclass=AsyncAdaptedQueuePool,
+    pool_size=db_config.SQLITE_READER_POOL_SIZE,
+    max_overflow=0,
+)
+db_config.apply_pragmas(writer_engine.sync_engine)
+db_config.apply_pragmas(reader_engine.sync_engine, readonly=True)
+metrics.instrument_engine(engine, "sync")
+metrics.instrument_engine(writer_engine.sync_engine, "writer")
+metrics.instrument_engine(reader_engine.sync_engine, "reader")
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="auth/token")
 
-def create_db_and_tables():
-    SQLModel.metadata.create_all(engine)
+async def create_db_and_tables():
+    async with writer_engine.begin() as conn:
+        await conn.run_sync(migrations.migrate)
+
+def new_read_session():
+    return AsyncSession(reader_engine, expire_on_commit=False)
+
+def new_write_session():
+    return AsyncSession(writer_engine, expire_on_commit=False)
+
+async def get_read_session():
+    async with new_read_session() as session:
+        yield session
 
-def get_session():
-    with Session(engine) as session:
+async def get_write_session():
+    async with new_write_session() as session:
         yield session
 
-SessionDep = Annotated[Session, Depends(get_session)]
\ No newline at end of file
+ReadSessionDep = Annotated[AsyncSession, Depends(get_read_session)]
+WriteSessionDep = Annotated[AsyncSession, Depends(get_write_session)]
@@ -0,0 +1,40 @@
+import os
+from dotenv import load_dotenv
+from sqlalchemy import event
+
+load_dotenv()
+
+DATABASE_FILE = os.getenv("DATABASE_FILE", "database.db")
+SQLITE_JOURNAL_MODE = os.getenv("SQLITE_JOURNAL_MODE", "WAL")
+SQLITE_SYNCHRONOUS = os.getenv("SQLITE_SYNCHRONOUS", "NORMAL")
+SQLITE_MMAP_SIZE = int(os.getenv("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024)))
+# negative values are in KiB rather than pages
+SQLITE_CACHE_SIZE = int(os.getenv("SQLITE_CACHE_SIZE", "-65536"))
+SQLITE_BUSY_TIMEOUT = int(os.getenv("SQLITE_BUSY_TIMEOUT", "5000"))
+SQLITE_READER_POOL_SIZE = int(os.getenv("SQLITE_READER_POOL_SIZE", "4"))
+
+def connection_pragmas(readonly: bool = False):
+    pragmas = [
+        f"PRAGMA busy_timeout = {SQLITE_BUSY_TIMEOUT}",
+        f"PRAGMA synchronous = {SQLITE_SYNCHRONOUS}",
+        f"PRAGMA mmap_size = {SQLITE_MMAP_SIZE}",
+        f"PRAGMA cache_size = {SQLITE_CACHE_SIZE}",
+    ]
+    if readonly:
+        pragmas.append("PRAGMA query_only = ON")
+    else:
+        # journal_mode is stored in the database file, so the writer sets it
+        pragmas.insert(0, f"PRAGMA journal_mode = {SQLITE_JOURNAL_MODE}")
+    return pragmas
+
+def apply_pragmas(engine, readonly: bool = False):
+    pragmas = connection_pragmas(readonly)
+
+    @event.listens_for(engine, "connect")
+    def on_connect(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for pragma in pragmas:
+            cursor.execute(pragma)
+        cursor.close()
+
+    return engine
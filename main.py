@@ -1,15 +1,19 @@
 from dotenv import load_dotenv
 from sqlmodel import SQLModel, Session, create_engine
 from fastapi import FastAPI
+from fastapi.responses import ORJSONResponse, PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
-from routers import auth, recipes, reviews
-from database import create_db_and_tables
+from routers import auth, changes, recipes, reviews
+from database import create_db_and_tables, new_read_session
+from utils import metrics, profiling, reference
+from utils.compression import CompressionMiddleware
 
-app = FastAPI()
+app = FastAPI(default_response_class=ORJSONResponse)
 routers = [
     auth.router,
     recipes.router,
     reviews.router,
+    changes.router,
 ]
 
 origins = [
@@ -20,14 +24,27 @@ origins = [
 for router in routers:
     app.include_router(router)
 
+app.add_middleware(CompressionMiddleware)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=origins,
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
-    expose_headers=["X-Page-Title", "X-Page-Description"]
+    expose_headers=["X-Page-Title", "X-Page-Description", "X-Next-Cursor"]
 )
+if profiling.PROFILE_ENABLED:
+    app.add_middleware(profiling.ProfilingMiddleware)
+# outermost, so the recorded latency includes the other middleware
+if metrics.METRICS_ENABLED:
+    app.add_middleware(metrics.MetricsMiddleware)
+
+@app.get("/metrics", response_class=PlainTextResponse, include_in_schema=False)
+async def read_metrics():
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
 @app.on_event("startup")
-def on_startup():
-    create_db_and_tables()
+async def on_startup():
+    await create_db_and_tables()
+    async with new_read_session() as session:
+        await reference.load(session)
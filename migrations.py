@@ -0,0 +1,125 @@
+"""Versioned schema migrations, tracked in SQLite's PRAGMA user_version.
+
+Append new steps to MIGRATIONS; never edit one that has shipped.
+"""
+from utils import changes, search, slugs
+
+BASELINE_TABLES = [
+    """CREATE TABLE IF NOT EXISTS tag (
+        name VARCHAR NOT NULL,
+        id INTEGER NOT NULL,
+        PRIMARY KEY (id)
+    )""",
+    "CREATE INDEX IF NOT EXISTS ix_tag_name ON tag (name)",
+    """CREATE TABLE IF NOT EXISTS cuisine (
+        name VARCHAR NOT NULL,
+        id INTEGER NOT NULL,
+        PRIMARY KEY (id)
+    )""",
+    "CREATE INDEX IF NOT EXISTS ix_cuisine_name ON cuisine (name)",
+    """CREATE TABLE IF NOT EXISTS user (
+        id INTEGER NOT NULL,
+        username VARCHAR NOT NULL,
+        password VARCHAR NOT NULL,
+        PRIMARY KEY (id)
+    )""",
+    "CREATE UNIQUE INDEX IF NOT EXISTS ix_user_username ON user (username)",
+    """CREATE TABLE IF NOT EXISTS recipe (
+        name VARCHAR NOT NULL,
+        servings INTEGER,
+        calories INTEGER,
+        protein INTEGER,
+        ingredients VARCHAR,
+        instructions VARCHAR,
+        id INTEGER NOT NULL,
+        tag_id INTEGER,
+        ingredients_html VARCHAR,
+        instructions_html VARCHAR,
+        PRIMARY KEY (id),
+        FOREIGN KEY(tag_id) REFERENCES tag (id)
+    )""",
+    "CREATE INDEX IF NOT EXISTS ix_recipe_name ON recipe (name)",
+    "CREATE INDEX IF NOT EXISTS ix_recipe_servings ON recipe (servings)",
+    "CREATE INDEX IF NOT EXISTS ix_recipe_calories ON recipe (calories)",
+    "CREATE INDEX IF NOT EXISTS ix_recipe_protein ON recipe (protein)",
+    """CREATE TABLE IF NOT EXISTS review (
+        name VARCHAR NOT NULL,
+        address VARCHAR,
+        visited BOOLEAN NOT NULL,
+        rating INTEGER,
+        notes VARCHAR,
+        id INTEGER NOT NULL,
+        cuisine_id INTEGER,
+        PRIMARY KEY (id),
+        FOREIGN KEY(cuisine_id) REFERENCES cuisine (id)
+    )""",
+    "CREATE INDEX IF NOT EXISTS ix_review_visited ON review (visited)",
+    "CREATE INDEX IF NOT EXISTS ix_review_name ON review (name)",
+    "CREATE INDEX IF NOT EXISTS ix_review_address ON review (address)",
+    "CREATE INDEX IF NOT EXISTS ix_review_rating ON review (rating)",
+]
+
+def table_columns(conn, table: str):
+    return {row[1] for row in conn.exec_driver_sql(f"PRAGMA table_info({table})")}
+
+def add_column(conn, table: str, column: str, definition: str):
+    if column not in table_columns(conn, table):
+        conn.exec_driver_sql(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+
+def baseline(conn):
+    # databases made by create_all() before migrations existed already have
+    # some of this, so every statement has to be safe to repeat
+    for statement in BASELINE_TABLES:
+        conn.exec_driver_sql(statement)
+    add_column(conn, "recipe", "ingredients_html", "VARCHAR")
+    add_column(conn, "recipe", "instructions_html", "VARCHAR")
+
+def listing_indexes(conn):
+    # one index per (filter, sort) shape used by the list endpoints; the
+    # integer primary key is the rowid, which every index already ends with
+    conn.exec_driver_sql("CREATE INDEX ix_recipe_tag_name ON recipe (tag_id, name)")
+    conn.exec_driver_sql(
+        "CREATE INDEX ix_review_listing ON review (visited DESC, rating DESC, name)"
+    )
+    conn.exec_driver_sql(
+        "CREATE INDEX ix_review_cuisine_listing ON review (cuisine_id, visited DESC, rating DESC, name)"
+    )
+
+def slug_columns(conn):
+    for table in ("recipe", "review"):
+        add_column(conn, table, "slug", "VARCHAR")
+        slugs.backfill(conn, table)
+        conn.exec_driver_sql(f"CREATE UNIQUE INDEX ix_{table}_slug ON {table} (slug)")
+
+def row_versions(conn):
+    for table in ("recipe", "review"):
+        add_column(conn, table, "version", "INTEGER NOT NULL DEFAULT 1")
+
+def change_entity_index(conn):
+    # each table's version is the newest entry for it, read on every write
+    conn.exec_driver_sql("CREATE INDEX ix_change_entity ON change (entity)")
+
+MIGRATIONS = [
+    (1, "baseline schema", baseline),
+    (2, "full-text search tables", search.create_search_tables),
+    (3, "composite listing indexes", listing_indexes),
+    (4, "unique slugs for recipes and reviews", slug_columns),
+    (5, "row versions for recipes and reviews", row_versions),
+    (6, "change log for the /changes feed", changes.create_change_log),
+    (7, "log recipes and reviews when their tag or cuisine changes", changes.log_dependent_rows),
+    (8, "index the change log by table", change_entity_index),
+]
+
+def current_version(conn) -> int:
+    return conn.exec_driver_sql("PRAGMA user_version").scalar()
+
+def migrate(conn):
+    version = current_version(conn)
+    applied = []
+    for target, name, step in MIGRATIONS:
+        if target <= version:
+            continue
+        step(conn)
+        conn.exec_driver_sql(f"PRAGMA user_version = {target}")
+        applied.append((target, name))
+    return applied
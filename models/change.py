@@ -0,0 +1,25 @@
+from sqlmodel import Field, SQLModel
+
+class Change(SQLModel, table=True):
+    id: int | None = Field(default=None, primary_key=True)
+    entity: str
+    entity_id: int
+    op: str
+    changed_at: int
+
+class ChangeHorizon(SQLModel, table=True):
+    __tablename__ = "change_horizon"
+    id: int = Field(default=1, primary_key=True)
+    horizon: int = Field(default=0)
+
+class ChangePublic(SQLModel):
+    cursor: int
+    entity: str
+    id: int
+    op: str
+    data: dict | None = None
+
+class ChangeFeed(SQLModel):
+    changes: list[ChangePublic]
+    cursor: int
+    more: bool
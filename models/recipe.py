@@ -13,9 +13,14 @@ class Recipe(RecipeBase, table=True):
     id: int | None = Field(default=None, primary_key=True)
     tag_id: int | None = Field(default=None, foreign_key="tag.id")
     tag: tag_model.Tag | None = Relationship()
+    ingredients_html: str | None = Field(default=None)
+    instructions_html: str | None = Field(default=None)
+    slug: str | None = Field(default=None, unique=True, index=True)
+    version: int = Field(default=1)
 
 class RecipePublic(RecipeBase):
     id: int
+    slug: str | None = None
 
 class RecipeCreate(RecipeBase):
     tag_id: int
@@ -29,5 +34,8 @@ class RecipeUpdate(RecipeBase):
     ingredients: str | None = None
     instructions: str | None = None
 
+class RecipeExport(RecipePublic):
+    tag_id: int | None = None
+
 class RecipePublicWithTag(RecipePublic):
     tag: tag_model.TagPublic | None = None
\ No newline at end of file
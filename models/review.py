@@ -12,9 +12,12 @@ class Review(ReviewBase, table=True):
     id: int | None = Field(default=None, primary_key=True)
     cuisine_id: int | None = Field(default=None, foreign_key="cuisine.id")
     cuisine: cuisine_model.Cuisine | None = Relationship()
+    slug: str | None = Field(default=None, unique=True, index=True)
+    version: int = Field(default=1)
 
 class ReviewPublic(ReviewBase):
     id: int
+    slug: str | None = None
 
 class ReviewCreate(ReviewBase):
     cuisine_id: int
@@ -27,6 +30,9 @@ class ReviewUpdate(ReviewBase):
     notes: str | None = None
     cuisine_id: int | None = None
 
+class ReviewExport(ReviewPublic):
+    cuisine_id: int | None = None
+
 class ReviewPublicWithCuisine(ReviewPublic):
     cuisine: cuisine_model.CuisinePublic | None = None
 
@@ -1,25 +1,40 @@
-import jwt
+import jwt, os
 from typing import Annotated
 
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Request
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
-from sqlmodel import Session
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
 from utils.auth_util import (
-    verify_password,
+    verify_password_async,
     encrypt_password,
     decode_token,
     generate_token
 )
+from utils.throttle import SlidingWindowLimiter
+from utils import profiling
 
 from models import token as token_model
 from models import user as user_model
-from database import engine, oauth2_scheme
+from database import ReadSessionDep, oauth2_scheme
 
 router = APIRouter(
     prefix="/auth",
     tags=["auth"],
+    route_class=profiling.route_class,
 )
 
+LOGIN_WINDOW_SECONDS = float(os.getenv("LOGIN_WINDOW_SECONDS", "60"))
+user_login_limiter = SlidingWindowLimiter(int(os.getenv("LOGIN_ATTEMPTS_PER_USER", "5")), LOGIN_WINDOW_SECONDS)
+ip_login_limiter = SlidingWindowLimiter(int(os.getenv("LOGIN_ATTEMPTS_PER_IP", "20")), LOGIN_WINDOW_SECONDS)
+
+async def get_user(session: AsyncSession, username: str):
+    users = await session.exec(
+        select(user_model.User)
+        .where(user_model.User.username == username)
+    )
+    return users.first()
+
 # @router.post("/signup", response_model=user_model.UserPublic)
 # async def create_user(
 #     user: Annotated[OAuth2PasswordRequestForm, Depends()]
@@ -51,32 +66,38 @@ router = APIRouter(
 
 @router.post("/token", response_model=token_model.Token)
 async def login_for_token(
-    token: Annotated[OAuth2PasswordRequestForm, Depends()]
+    request: Request,
+    token: Annotated[OAuth2PasswordRequestForm, Depends()],
+    session: ReadSessionDep,
 ):
-    with Session(engine) as db:
-        db_user = (
-            db.query(user_model.User)
-            .filter(user_model.User.username == token.username)
-            .first()
+    client_ip = request.client.host if request.client else "unknown"
+    if not (ip_login_limiter.allow(client_ip) and user_login_limiter.allow(token.username)):
+        raise HTTPException(
+            status_code=429,
+            detail="Too many login attempts",
+            headers={"Retry-After": str(int(LOGIN_WINDOW_SECONDS))},
         )
-        if not db_user:
-            raise HTTPException(
-                status_code=401,
-                detail="Incorrect password",
-                headers={"WWW-Authenticate": "Bearer"},
-            )
-        if not verify_password(token.password, db_user.password):
-            raise HTTPException(
-                status_code=404,
-                detail="Incorrect password",
-                headers={"WWW-Authenticate": "Bearer"}
-            )
-        access_token = generate_token(username=token.username)
-        return token_model.Token(access_token=access_token, token_type="bearer")
+
+    db_user = await get_user(session, token.username)
+    if not db_user:
+        raise HTTPException(
+            status_code=401,
+            detail="Incorrect password",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    if not await verify_password_async(token.password, db_user.password):
+        raise HTTPException(
+            status_code=404,
+            detail="Incorrect password",
+            headers={"WWW-Authenticate": "Bearer"}
+        )
+    access_token = generate_token(username=token.username)
+    return token_model.Token(access_token=access_token, token_type="bearer")
         
 @router.get("/me")
 async def read_current_user(
     token: Annotated[str, Depends(oauth2_scheme)],
+    session: ReadSessionDep,
 ):
     try:
         payload = decode_token(token)
@@ -94,15 +115,10 @@ async def read_current_user(
             detail="Invalid authentication credentials",
             headers={"WWW-Authenticate": "Bearer"},
         ) from e
-    with Session(engine) as db:
-        db_user = (
-            db.query(user_model.User)
-            .filter(user_model.User.username == token_data.username)
-            .first()
+    db_user = await get_user(session, token_data.username)
+    if db_user is None:
+        raise HTTPException(
+            status_code=404,
+            detail="User not found",
         )
-        if db_user is None:
-            raise HTTPException(
-                status_code=404,
-                detail="User not found",
-            )
-        return db_user
\ No newline at end of file
+    return db_user
\ No newline at end of file
@@ -0,0 +1,84 @@
+import asyncio, orjson, os
+from typing import Annotated
+from fastapi import APIRouter, Header, HTTPException, Query, Request
+from fastapi.responses import ORJSONResponse, StreamingResponse
+from database import ReadSessionDep, new_read_session
+
+from utils import (
+    changes as changes,
+    conditional as conditional,
+    pagination as pagination,
+    profiling as profiling
+)
+
+from models import change as change_model
+
+router = APIRouter(
+    prefix="/changes",
+    tags=["changes"],
+    route_class=profiling.route_class,
+)
+
+CHANGES_POLL_SECONDS = float(os.getenv("CHANGES_POLL_SECONDS", "1"))
+CHANGES_KEEPALIVE_SECONDS = float(os.getenv("CHANGES_KEEPALIVE_SECONDS", "15"))
+STREAM_BATCH_SIZE = 500
+
+def check_horizon(since: int, head: int, horizon: int):
+    # since=0 is always answerable: compaction keeps every live row's newest
+    # upsert, and a client starting from nothing needs no tombstones
+    if 0 < since < horizon:
+        # the tombstones this cursor still needed have been compacted away
+        raise HTTPException(status_code=410, detail={
+            "message": "Cursor is older than the change log; refetch from since=0",
+            "horizon": horizon,
+            "head": head,
+        })
+
+@router.get("", response_model=change_model.ChangeFeed)
+async def read_changes(
+    request: Request,
+    session: ReadSessionDep,
+    since: Annotated[int, Query(ge=0, le=pagination.INT64_MAX)] = 0,
+    limit: Annotated[int, Query(gt=0, le=1000)] = 500,
+):
+    # validated against the log itself rather than this process's table
+    # versions, which miss writes made by other workers and scripts
+    head, horizon = await changes.head_and_horizon(session)
+    cache_headers = conditional.state_validators(request, f"{head}-{horizon}")
+    if conditional.is_not_modified(request, cache_headers):
+        raise HTTPException(status_code=304, headers=cache_headers)
+    check_horizon(since, head, horizon)
+    items, cursor, more = await changes.read(session, since, limit)
+    return ORJSONResponse({"changes": items, "cursor": cursor, "more": more}, headers=cache_headers)
+
+@router.get("/stream")
+async def stream_changes(
+    request: Request,
+    since: Annotated[int, Query(ge=0, le=pagination.INT64_MAX)] = 0,
+    last_event_id: Annotated[int | None, Header(ge=0, le=pagination.INT64_MAX)] = None,
+):
+    # a reconnecting EventSource sends the id of the last event it got
+    since = last_event_id if last_event_id is not None else since
+    async with new_read_session() as session:
+        check_horizon(since, *await changes.head_and_horizon(session))
+
+    async def events():
+        cursor = since
+        idle = 0.0
+        while not await request.is_disconnected():
+            # a fresh session per poll, so no read snapshot is held open
+            # while waiting, which would keep WAL checkpoints from finishing
+            async with new_read_session() as session:
+                items, cursor, more = await changes.read(session, cursor, STREAM_BATCH_SIZE)
+            if items:
+                idle = 0.0
+                yield "".join(f"id: {item['cursor']}\nevent: change\ndata: {orjson.dumps(item).decode()}\n\n" for item in items)
+                if more:
+                    continue
+            elif idle >= CHANGES_KEEPALIVE_SECONDS:
+                idle = 0.0
+                yield ": keepalive\n\n"
+            await asyncio.sleep(CHANGES_POLL_SECONDS)
+            idle += CHANGES_POLL_SECONDS
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
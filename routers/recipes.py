@@ -1,12 +1,25 @@
 from typing import Annotated
-from sqlmodel import Session, select
-from fastapi import APIRouter, Depends, HTTPException, Query
-from fastapi.responses import HTMLResponse, JSONResponse
-from database import SessionDep, oauth2_scheme
+from sqlmodel import select
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from fastapi.responses import HTMLResponse, ORJSONResponse, StreamingResponse
+from database import ReadSessionDep, WriteSessionDep, new_read_session, oauth2_scheme
 
 from utils import (
     generate_html as gen_html,
-    auth_util as auth_util
+    html_cache as html_cache,
+    markdown_util as markdown_util,
+    search as search,
+    pagination as pagination,
+    ndjson as ndjson,
+    conditional as conditional,
+    compression as compression,
+    auth_util as auth_util,
+    profiling as profiling,
+    serialize as serialize,
+    slugs as slugs,
+    card_cache as card_cache,
+    facets as facets,
+    reference as reference
 )
 
 from models import (
@@ -17,97 +30,237 @@ from models import (
 router = APIRouter(
     prefix="/recipes",
     tags=["recipes"],
+    route_class=profiling.route_class,
 )
 
+STREAM_BATCH_SIZE = 100
+RECIPE_ORDER = facets.RECIPE_SORTS["name"]
+
 
 ###########
 # RECIPES #
 ###########
 @router.post("/create/", response_model=recipe_model.RecipePublic)
-def create_recipe(token: Annotated[str, Depends(oauth2_scheme)],
+async def create_recipe(token: Annotated[str, Depends(oauth2_scheme)],
     recipe: recipe_model.RecipeCreate,
-    session: SessionDep,
+    session: WriteSessionDep,
     claims: dict = Depends(auth_util.verify_token)):
     db_recipe = recipe_model.Recipe.model_validate(recipe)
+    markdown_util.render_recipe_markdown(db_recipe)
+    db_recipe.slug = await slugs.unique_slug(session, recipe_model.Recipe, db_recipe.name)
     session.add(db_recipe)
-    session.commit()
-    session.refresh(db_recipe)
+    await session.commit()
+    await session.refresh(db_recipe)
+    html_cache.invalidate("recipe")
     return db_recipe
 
 @router.get("/all/", response_model=list[recipe_model.RecipePublicWithTag])
-def read_recipes(
-    session: SessionDep,
-    offset: int = 0,
-    limit: Annotated[int, Query(le=100)] = 100,
+async def read_recipes(
+    session: ReadSessionDep,
+    cursor: str | None = None,
+    limit: Annotated[int, Query(gt=0, le=100)] = 100,
+    sort: facets.RecipeSort = "name",
+    filters: facets.RecipeFilters = Depends(facets.recipe_filters),
+    cache_headers: dict = conditional.validate("recipe", "tag"),
+):
+    # plain rows shaped like the response_model, returned as a response so
+    # FastAPI doesn't validate and re-encode them
+    statement = filters.apply(serialize.recipes_with_tag.select())
+    rows, next_cursor = await pagination.fetch_page(session, statement, facets.RECIPE_SORTS[sort], cursor, limit)
+    headers = {**cache_headers, "X-Next-Cursor": next_cursor} if next_cursor else cache_headers
+    return ORJSONResponse(serialize.recipes_with_tag.dicts(rows), headers=headers)
+
+# declared before /{recipe_id} so "search" isn't parsed as an id
+@router.get("/search", response_model=list[recipe_model.RecipePublicWithTag])
+async def search_recipes(
+    session: ReadSessionDep,
+    response: Response,
+    q: str,
+    limit: Annotated[int, Query(gt=0, le=100)] = 20,
+    cache_headers: dict = conditional.validate("recipe", "tag"),
+):
+    response.headers.update(cache_headers)
+    statement = search.search_recipes(q, limit)
+    if statement is None:
+        return []
+    recipes = await session.exec(statement)
+    return recipes.all()
+
+@router.get("/search/html", response_class=HTMLResponse)
+async def search_recipes_html(
+    session: ReadSessionDep,
+    response: Response,
+    q: str,
+    limit: Annotated[int, Query(gt=0, le=100)] = 20,
+    cache_headers: dict = conditional.validate("recipe", "tag"),
+):
+    response.headers.update(cache_headers)
+    statement = search.search_recipes(q, limit)
+    if statement is None:
+        return ""
+    recipes = await session.exec(statement)
+    return "".join(gen_html.generate_recipes(recipes))
+
+@router.post("/import")
+async def import_recipes(token: Annotated[str, Depends(oauth2_scheme)],
+    request: Request,
+    session: WriteSessionDep,
+    claims: dict = Depends(auth_util.verify_token)):
+    result = await ndjson.import_rows(
+        session,
+        request,
+        recipe_model.RecipeCreate,
+        recipe_model.Recipe,
+        prepare=markdown_util.render_recipe_markdown_row,
+        before_insert=lambda rows: slugs.assign_slugs(session, recipe_model.Recipe, rows),
+    )
+    if result["inserted"]:
+        html_cache.invalidate("recipe")
+    return result
+
+@router.get("/export")
+async def export_recipes(token: Annotated[str, Depends(oauth2_scheme)],
+    claims: dict = Depends(auth_util.verify_token)):
+    statement = select(recipe_model.Recipe)
+    return StreamingResponse(
+        ndjson.export_rows(new_read_session, statement, [(recipe_model.Recipe.id, False)], recipe_model.RecipeExport),
+        media_type="application/x-ndjson",
+    )
+
+@router.get("/facets")
+async def read_recipe_facets(
+    session: ReadSessionDep,
+    filters: facets.RecipeFilters = Depends(facets.recipe_filters),
+    cache_headers: dict = conditional.validate("recipe", "tag"),
 ):
-    recipes = session.exec(select(recipe_model.Recipe).order_by(recipe_model.Recipe.name).offset(offset).limit(limit)).all()
-    return recipes
+    async def render():
+        rows = (await session.exec(facets.facet_statement(filters))).all()
+        return facets.facet_counts(rows, filters)
+
+    key = html_cache.make_key("/recipes/facets", ("recipe", "tag"), **filters.cache_params())
+    return ORJSONResponse(await html_cache.get_or_render(key, render), headers=cache_headers)
+
+# two segments, so it can't collide with /{recipe_id}, but kept with the
+# other fixed paths ahead of it
+@router.get("/by-slug/{slug}", response_model=recipe_model.RecipePublic)
+async def read_recipe_by_slug(slug: str, session: ReadSessionDep,
+    response: Response,
+    cache_headers: dict = conditional.validate("recipe")):
+    recipe = (await session.exec(select(recipe_model.Recipe).where(recipe_model.Recipe.slug == slug))).first()
+    if not recipe:
+        raise HTTPException(status_code=404, detail="Recipe not found")
+    response.headers.update(cache_headers)
+    return recipe
+
+@router.get("/by-slug/{slug}/html", response_class=HTMLResponse)
+async def get_recipe_html_by_slug(slug: str, session: ReadSessionDep,
+    cache_headers: dict = conditional.validate("recipe", "tag")):
+    statement = select(recipe_model.Recipe).where(recipe_model.Recipe.slug == slug)
+    recipe = (await session.exec(statement)).first()
+    return recipe_html_response(recipe, cache_headers)
 
 @router.get("/{recipe_id}", response_model=recipe_model.RecipePublic)
-def read_recipe(recipe_id: int, session: SessionDep):
-    recipe = session.get(recipe_model.Recipe, recipe_id)
+async def read_recipe(recipe_id: int, session: ReadSessionDep,
+    response: Response,
+    cache_headers: dict = conditional.validate("recipe")):
+    recipe = await session.get(recipe_model.Recipe, recipe_id)
     if not recipe:
         raise HTTPException(status_code=404, detail="Recipe not found")
+    response.headers.update(cache_headers)
     return recipe
 
 @router.patch("/{recipe_id}", response_model=recipe_model.RecipePublic)
-def update_recipe(token: Annotated[str, Depends(oauth2_scheme)],
+async def update_recipe(token: Annotated[str, Depends(oauth2_scheme)],
     recipe_id: int,
     recipe: recipe_model.RecipeUpdate,
-    session: SessionDep,
+    session: WriteSessionDep,
     claims: dict = Depends(auth_util.verify_token)):
-    recipe_db = session.get(recipe_model.Recipe, recipe_id)
+    recipe_db = await session.get(recipe_model.Recipe, recipe_id)
     if not recipe_db:
         raise HTTPException(status_code=404, detail="Recipe not found")
     recipe_data = recipe.model_dump(exclude_unset=True)
+    renamed = "name" in recipe_data and recipe_data["name"] != recipe_db.name
     recipe_db.sqlmodel_update(recipe_data)
+    if "ingredients" in recipe_data or "instructions" in recipe_data:
+        markdown_util.render_recipe_markdown(recipe_db)
+    if renamed:
+        recipe_db.slug = await slugs.unique_slug(session, recipe_model.Recipe, recipe_db.name, exclude_id=recipe_id)
+    recipe_db.version += 1
     session.add(recipe_db)
-    session.commit()
-    session.refresh(recipe_db)
+    await session.commit()
+    await session.refresh(recipe_db)
+    html_cache.invalidate("recipe")
     return recipe_db
 
 @router.delete("/{recipe_id}")
-def delete_recipe(token: Annotated[str, Depends(oauth2_scheme)],
+async def delete_recipe(token: Annotated[str, Depends(oauth2_scheme)],
     recipe_id: int,
-    session: SessionDep,
+    session: WriteSessionDep,
     claims: dict = Depends(auth_util.verify_token)):
-    recipe = session.get(recipe_model.Recipe, recipe_id)
+    recipe = await session.get(recipe_model.Recipe, recipe_id)
     if not recipe:
         raise HTTPException(status_code=404, detail="Recipe not found")
-    session.delete(recipe)
-    session.commit()
+    await session.delete(recipe)
+    await session.commit()
+    html_cache.invalidate("recipe")
+    card_cache.discard("recipe", recipe_id)
     return {"ok": True}
 
 #  response_model=list[recipe_model.RecipePublicWithTag]
 @router.get("/all/html", response_class=HTMLResponse)
-def get_recipes_html(session: SessionDep, tag: str = "all"):
-    if tag == "all":
-        statement = select(recipe_model.Recipe).order_by(recipe_model.Recipe.name)
-    else:
-        statement = select(recipe_model.Recipe).order_by(recipe_model.Recipe.name).where(recipe_model.Recipe.tag_id == int(tag))
-    results = session.exec(statement).all()
-    
-    if not results:
-        return ""
+async def get_recipes_html(
+    request: Request,
+    cursor: str | None = None,
+    limit: Annotated[int | None, Query(gt=0, le=100)] = None,
+    sort: facets.RecipeSort = "name",
+    filters: facets.RecipeFilters = Depends(facets.recipe_filters),
+    cache_headers: dict = conditional.validate("recipe", "tag"),
+):
+    statement = filters.apply(select(recipe_model.Recipe))
+    order = facets.RECIPE_SORTS[sort]
+    params = {**filters.cache_params(), "sort": sort}
+
+    if limit is not None:
+        async def render_page():
+            async with new_read_session() as session:
+                recipes, next_cursor = await pagination.fetch_page(session, statement, order, cursor, limit)
+            return "".join(gen_html.generate_recipes(recipes)), next_cursor
+
+        key = html_cache.make_key("/recipes/all/html", ("recipe", "tag"), cursor=cursor, limit=limit, **params)
+        html, next_cursor = await html_cache.get_or_render(key, render_page)
+        headers = {**cache_headers, "X-Next-Cursor": next_cursor} if next_cursor else cache_headers
+        return compression.cached_response(request, key, html, headers)
+
+    key = html_cache.make_key("/recipes/all/html", ("recipe", "tag"), **params)
+    html = html_cache.get(key)
+    if html is not None:
+        precompress = filters.tag_only() and sort == "name"
+        return compression.cached_response(request, key, html, cache_headers, precompress=precompress)
 
-    html = gen_html.generate_recipes(results)
+    async def render():
+        async for recipes in pagination.iter_pages(new_read_session, statement, order, STREAM_BATCH_SIZE):
+            for card in gen_html.generate_recipes(recipes):
+                yield card
 
-    return html
+    return StreamingResponse(html_cache.stream(key, render), media_type="text/html", headers=cache_headers)
 
 @router.get("/one/html", response_class=HTMLResponse)
-def get_recipe_html(session: SessionDep, id: int = 0):
+async def get_recipe_html(session: ReadSessionDep, id: int = 0,
+    cache_headers: dict = conditional.validate("recipe", "tag")):
     statement = select(recipe_model.Recipe).where(recipe_model.Recipe.id == int(id))
-    recipe = session.exec(statement).all()[0]
+    recipe = (await session.exec(statement)).first()
+    return recipe_html_response(recipe, cache_headers)
 
+def recipe_html_response(recipe: recipe_model.Recipe | None, cache_headers: dict):
     html = ""
     
     if not recipe:
         html = gen_html.generate_error_html()
-        return html
+        return HTMLResponse(content=html)
     
     html = gen_html.generate_recipe(recipe)
 
-    response = HTMLResponse(content=html)
+    response = HTMLResponse(content=html, headers=cache_headers)
     response.headers["X-Page-Title"] = recipe.name
     response.headers["X-Page-Description"] = f"{recipe.servings} servings, {recipe.calories} calories, {recipe.protein}g protein"
     return response
@@ -116,39 +269,45 @@ def get_recipe_html(session: SessionDep, id: int = 0):
 # TAGS #
 ########
 @router.post("/tag", response_model=tag_model.TagPublic)
-def create_tag(token: Annotated[str, Depends(oauth2_scheme)],
+async def create_tag(token: Annotated[str, Depends(oauth2_scheme)],
     tag: tag_model.TagCreate,
-    session: SessionDep,
+    session: WriteSessionDep,
     claims: dict = Depends(auth_util.verify_token)):
     db_tag = tag_model.Tag.model_validate(tag)
     session.add(db_tag)
-    session.commit()
-    session.refresh(db_tag)
+    await session.commit()
+    await session.refresh(db_tag)
+    reference.tags.add(db_tag.id, db_tag.name)
+    html_cache.invalidate("tag")
     return db_tag
 
 @router.get("/tags/", response_model=list[tag_model.TagPublic])
-def read_tags(
-    session: SessionDep,
+async def read_tags(
     offset: int = 0,
     limit: Annotated[int, Query(le=100)] = 100,
+    cache_headers: dict = conditional.validate("tag"),
 ):
-    tags = session.exec(select(tag_model.Tag).offset(offset).limit(limit)).all()
-    return tags
+    return ORJSONResponse(reference.tags.page(offset, limit), headers=cache_headers)
 
 @router.delete("/tag/{tag_id}")
-def delete_tag(token: Annotated[str, Depends(oauth2_scheme)],
-    tag_id: int, session: SessionDep,
+async def delete_tag(token: Annotated[str, Depends(oauth2_scheme)],
+    tag_id: int, session: WriteSessionDep,
     claims: dict = Depends(auth_util.verify_token)):
-    tag = session.get(tag_model.Tag, tag_id)
+    tag = await session.get(tag_model.Tag, tag_id)
     if not tag:
         raise HTTPException(status_code=404, detail="Tag not found")
-    session.delete(tag)
-    session.commit()
+    await session.delete(tag)
+    await session.commit()
+    reference.tags.remove(tag_id)
+    html_cache.invalidate("tag")
     return {"ok": True}
 
 @router.get("/tags/html", response_class=HTMLResponse)
-def get_tags_html(session: SessionDep):
-    tags = session.exec(select(tag_model.Tag))
-    html = gen_html.generate_tags(tags)
+async def get_tags_html(request: Request,
+    cache_headers: dict = conditional.validate("tag")):
+    async def render():
+        return gen_html.generate_tags(reference.tags.items())
 
-    return html
\ No newline at end of file
+    key = html_cache.make_key("/recipes/tags/html", ("tag",))
+    html = await html_cache.get_or_render(key, render)
+    return compression.cached_response(request, key, html, cache_headers, precompress=True)
\ No newline at end of file
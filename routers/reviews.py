@@ -1,13 +1,24 @@
 from typing import Annotated
-from sqlmodel import Session, select
-from fastapi import APIRouter, Depends, HTTPException, Query
-from fastapi.responses import HTMLResponse, JSONResponse
-from database import SessionDep, oauth2_scheme
+from sqlmodel import select
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from fastapi.responses import HTMLResponse, ORJSONResponse, StreamingResponse
+from database import ReadSessionDep, WriteSessionDep, new_read_session, oauth2_scheme
 
 
 from utils import (
     generate_html as gen_html,
-    auth_util as auth_util
+    html_cache as html_cache,
+    search as search,
+    pagination as pagination,
+    ndjson as ndjson,
+    conditional as conditional,
+    compression as compression,
+    auth_util as auth_util,
+    profiling as profiling,
+    serialize as serialize,
+    slugs as slugs,
+    card_cache as card_cache,
+    reference as reference
 )
 
 from models import (
@@ -17,122 +28,240 @@ from models import (
 
 router = APIRouter(
     prefix="/reviews",
-    tags=["reviews"]
+    tags=["reviews"],
+    route_class=profiling.route_class,
 )
 
+STREAM_BATCH_SIZE = 100
+REVIEW_ORDER = [
+    (review_model.Review.visited, True),
+    (review_model.Review.rating, True),
+    (review_model.Review.name, False),
+    (review_model.Review.id, False),
+]
+
     
 ###########
 # REVIEWS #
 ###########
 @router.post("/create/", response_model=review_model.ReviewPublic)
-def create_review(token: Annotated[str, Depends(oauth2_scheme)],
+async def create_review(token: Annotated[str, Depends(oauth2_scheme)],
     review: review_model.ReviewCreate,
-    session: SessionDep,
+    session: WriteSessionDep,
     claims: dict = Depends(auth_util.verify_token)):
     db_review = review_model.Review.model_validate(review)
+    db_review.slug = await slugs.unique_slug(session, review_model.Review, db_review.name)
     session.add(db_review)
-    session.commit()
-    session.refresh(db_review)
+    await session.commit()
+    await session.refresh(db_review)
+    html_cache.invalidate("review")
     return db_review
 
 @router.get("/all/", response_model=list[review_model.ReviewPublicWithCuisine])
-def read_reviews(session: SessionDep):
-    reviews = session.exec(
-        select(review_model.Review).order_by(review_model.Review.visited.desc(), 
-            review_model.Review.rating.desc(), review_model.Review.name)
+async def read_reviews(
+    session: ReadSessionDep,
+    cursor: str | None = None,
+    limit: Annotated[int, Query(gt=0, le=100)] = 100,
+    cache_headers: dict = conditional.validate("review", "cuisine"),
+):
+    # plain rows shaped like the response_model, returned as a response so
+    # FastAPI doesn't validate and re-encode them
+    rows, next_cursor = await pagination.fetch_page(session, serialize.reviews_with_cuisine.select(), REVIEW_ORDER, cursor, limit)
+    headers = {**cache_headers, "X-Next-Cursor": next_cursor} if next_cursor else cache_headers
+    return ORJSONResponse(serialize.reviews_with_cuisine.dicts(rows), headers=headers)
+
+# declared before /{review_id} so "search" isn't parsed as an id
+@router.get("/search", response_model=list[review_model.ReviewPublicWithCuisine])
+async def search_reviews(
+    session: ReadSessionDep,
+    response: Response,
+    q: str,
+    limit: Annotated[int, Query(gt=0, le=100)] = 20,
+    cache_headers: dict = conditional.validate("review", "cuisine"),
+):
+    response.headers.update(cache_headers)
+    statement = search.search_reviews(q, limit)
+    if statement is None:
+        return []
+    reviews = await session.exec(statement)
+    return reviews.all()
+
+@router.get("/search/html", response_class=HTMLResponse)
+async def search_reviews_html(
+    session: ReadSessionDep,
+    response: Response,
+    q: str,
+    limit: Annotated[int, Query(gt=0, le=100)] = 20,
+    cache_headers: dict = conditional.validate("review", "cuisine"),
+):
+    response.headers.update(cache_headers)
+    statement = search.search_reviews(q, limit)
+    if statement is None:
+        return ""
+    reviews = await session.exec(statement)
+    return "".join(gen_html.generate_reviews(reviews))
+
+@router.post("/import")
+async def import_reviews(token: Annotated[str, Depends(oauth2_scheme)],
+    request: Request,
+    session: WriteSessionDep,
+    claims: dict = Depends(auth_util.verify_token)):
+    result = await ndjson.import_rows(
+        session,
+        request,
+        review_model.ReviewCreate,
+        review_model.Review,
+        before_insert=lambda rows: slugs.assign_slugs(session, review_model.Review, rows),
+    )
+    if result["inserted"]:
+        html_cache.invalidate("review")
+    return result
+
+@router.get("/export")
+async def export_reviews(token: Annotated[str, Depends(oauth2_scheme)],
+    claims: dict = Depends(auth_util.verify_token)):
+    statement = select(review_model.Review)
+    return StreamingResponse(
+        ndjson.export_rows(new_read_session, statement, [(review_model.Review.id, False)], review_model.ReviewExport),
+        media_type="application/x-ndjson",
     )
-    return reviews
+
+# two segments, so it can't collide with /{review_id}, but kept with the
+# other fixed paths ahead of it
+@router.get("/by-slug/{slug}", response_model=review_model.ReviewPublic)
+async def read_review_by_slug(slug: str, session: ReadSessionDep,
+    response: Response,
+    cache_headers: dict = conditional.validate("review")):
+    review = (await session.exec(select(review_model.Review).where(review_model.Review.slug == slug))).first()
+    if not review:
+        raise HTTPException(status_code=404, detail="Review not found")
+    response.headers.update(cache_headers)
+    return review
 
 @router.get("/{review_id}", response_model=review_model.ReviewPublic)
-def read_review(review_id: int, session: SessionDep):
-    review = session.get(review_model.Review, review_id)
+async def read_review(review_id: int, session: ReadSessionDep,
+    response: Response,
+    cache_headers: dict = conditional.validate("review")):
+    review = await session.get(review_model.Review, review_id)
     if not review:
         raise HTTPException(status_code=404, detail="Review not found")
+    response.headers.update(cache_headers)
     return review
 
 @router.patch("/{review_id}", response_model=review_model.ReviewPublic)
-def update_review(token: Annotated[str, Depends(oauth2_scheme)],
+async def update_review(token: Annotated[str, Depends(oauth2_scheme)],
     review_id: int,
     review: review_model.ReviewUpdate,
-    session: SessionDep,
+    session: WriteSessionDep,
     claims: dict = Depends(auth_util.verify_token)):
-    review_db = session.get(review_model.Review, review_id)
+    review_db = await session.get(review_model.Review, review_id)
     if not review_db:
         raise HTTPException(status_code=404, detail="Review not found")
     review_data = review.model_dump(exclude_unset=True)
+    renamed = "name" in review_data and review_data["name"] != review_db.name
     review_db.sqlmodel_update(review_data)
+    if renamed:
+        review_db.slug = await slugs.unique_slug(session, review_model.Review, review_db.name, exclude_id=review_id)
+    review_db.version += 1
     session.add(review_db)
-    session.commit()
-    session.refresh(review_db)
+    await session.commit()
+    await session.refresh(review_db)
+    html_cache.invalidate("review")
     return review_db
 
 @router.delete("/{review_id}")
-def delete_review(token: Annotated[str, Depends(oauth2_scheme)],
+async def delete_review(token: Annotated[str, Depends(oauth2_scheme)],
     review_id: int,
-    session: SessionDep,
+    session: WriteSessionDep,
     claims: dict = Depends(auth_util.verify_token)):
-    review = session.get(review_model.Review, review_id)
+    review = await session.get(review_model.Review, review_id)
     if not review:
         raise HTTPException(status_code=404, detail="Review not found")
-    session.delete(review)
-    session.commit()
+    await session.delete(review)
+    await session.commit()
+    html_cache.invalidate("review")
+    card_cache.discard("review", review_id)
     return {"ok": True}
 
 @router.get("/all/html", response_class=HTMLResponse)
-def get_recipes_html(session: SessionDep, cuisine: str = "all"):
-    if cuisine == "all":
-        statement = select(review_model.Review).order_by(review_model.Review.visited.desc(),
-            review_model.Review.rating.desc(), review_model.Review.name)
-    else:
-        statement = select(review_model.Review).where(review_model.Review.cuisine_id == int(cuisine)).order_by(review_model.Review.visited.desc(), 
-            review_model.Review.rating.desc(), review_model.Review.name)
-    results = session.exec(statement).all()
-    
-    if not results:
-        return ""
+async def get_recipes_html(
+    request: Request,
+    cuisine: str = "all",
+    cursor: str | None = None,
+    limit: Annotated[int | None, Query(gt=0, le=100)] = None,
+    cache_headers: dict = conditional.validate("review", "cuisine"),
+):
+    statement = select(review_model.Review)
+    if cuisine != "all":
+        statement = statement.where(review_model.Review.cuisine_id == int(cuisine))
+
+    if limit is not None:
+        async def render_page():
+            async with new_read_session() as session:
+                reviews, next_cursor = await pagination.fetch_page(session, statement, REVIEW_ORDER, cursor, limit)
+            return "".join(gen_html.generate_reviews(reviews)), next_cursor
+
+        key = html_cache.make_key("/reviews/all/html", ("review", "cuisine"), cuisine=cuisine, cursor=cursor, limit=limit)
+        html, next_cursor = await html_cache.get_or_render(key, render_page)
+        headers = {**cache_headers, "X-Next-Cursor": next_cursor} if next_cursor else cache_headers
+        return compression.cached_response(request, key, html, headers)
+
+    key = html_cache.make_key("/reviews/all/html", ("review", "cuisine"), cuisine=cuisine)
+    html = html_cache.get(key)
+    if html is not None:
+        return compression.cached_response(request, key, html, cache_headers, precompress=True)
 
-    html = gen_html.generate_reviews(results)
+    async def render():
+        async for reviews in pagination.iter_pages(new_read_session, statement, REVIEW_ORDER, STREAM_BATCH_SIZE):
+            for card in gen_html.generate_reviews(reviews):
+                yield card
 
-    return html
+    return StreamingResponse(html_cache.stream(key, render), media_type="text/html", headers=cache_headers)
 
     
 ############
 # CUISINES #
 ############
 @router.post("/cuisine", response_model=cuisine_model.CuisinePublic)
-def create_Cuisine(token: Annotated[str, Depends(oauth2_scheme)],
+async def create_Cuisine(token: Annotated[str, Depends(oauth2_scheme)],
     cuisine: cuisine_model.CuisineCreate,
-    session: SessionDep,
+    session: WriteSessionDep,
     claims: dict = Depends(auth_util.verify_token)):
     db_cuisine = cuisine_model.Cuisine.model_validate(cuisine)
     session.add(db_cuisine)
-    session.commit()
-    session.refresh(db_cuisine)
+    await session.commit()
+    await session.refresh(db_cuisine)
+    reference.cuisines.add(db_cuisine.id, db_cuisine.name)
+    html_cache.invalidate("cuisine")
     return db_cuisine
 
 @router.get("/cuisines/", response_model=list[cuisine_model.CuisinePublic])
-def read_Cuisines(
-    session: SessionDep,
+async def read_Cuisines(
+    cache_headers: dict = conditional.validate("cuisine"),
 ):
-    cuisines = session.exec(select(cuisine_model.Cuisine).order_by(cuisine_model.Cuisine.name)).all()
-    return cuisines
+    return ORJSONResponse(reference.cuisines.items(), headers=cache_headers)
 
 
 @router.delete("/cuisine/{cuisine_id}")
-def delete_cuisine(token: Annotated[str, Depends(oauth2_scheme)],
+async def delete_cuisine(token: Annotated[str, Depends(oauth2_scheme)],
     cuisine_id: int,
-    session: SessionDep,
+    session: WriteSessionDep,
     claims: dict = Depends(auth_util.verify_token)):
-    cuisine = session.get(cuisine_model.Cuisine, cuisine_id)
+    cuisine = await session.get(cuisine_model.Cuisine, cuisine_id)
     if not cuisine:
         raise HTTPException(status_code=404, detail="Cuisine not found")
-    session.delete(cuisine)
-    session.commit()
+    await session.delete(cuisine)
+    await session.commit()
+    reference.cuisines.remove(cuisine_id)
+    html_cache.invalidate("cuisine")
     return {"ok": True}
 
 @router.get("/cuisines/html", response_class=HTMLResponse)
-def get_tags_html(session: SessionDep):
-    cuisines = session.exec(select(cuisine_model.Cuisine).order_by(cuisine_model.Cuisine.name))
-    html = gen_html.generate_tags(cuisines)
+async def get_tags_html(request: Request,
+    cache_headers: dict = conditional.validate("cuisine")):
+    async def render():
+        return gen_html.generate_tags(reference.cuisines.items())
 
-    return html
\ No newline at end of file
+    key = html_cache.make_key("/reviews/cuisines/html", ("cuisine",))
+    html = await html_cache.get_or_render(key, render)
+    return compression.cached_response(request, key, html, cache_headers, precompress=True)
\ No newline at end of file
@@ -0,0 +1,41 @@
+"""Fill in the stored Markdown HTML for recipes created before it existed.
+
+Usage: python -m scripts.backfill_markdown [--all]
+"""
+import argparse
+from sqlmodel import Session, select
+
+import migrations
+from database import engine
+from models import recipe as recipe_model
+from utils import markdown_util
+
+BATCH_SIZE = 200
+
+def backfill(rerender_all: bool = False):
+    statement = select(recipe_model.Recipe)
+    if not rerender_all:
+        statement = statement.where(
+            (recipe_model.Recipe.ingredients_html == None)
+            | (recipe_model.Recipe.instructions_html == None)
+        )
+
+    updated = 0
+    with Session(engine) as session:
+        for recipe in session.exec(statement).all():
+            markdown_util.render_recipe_markdown(recipe)
+            session.add(recipe)
+            updated += 1
+            if updated % BATCH_SIZE == 0:
+                session.commit()
+        session.commit()
+    return updated
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--all", action="store_true", help="re-render every recipe, not just missing ones")
+    args = parser.parse_args()
+
+    with engine.begin() as conn:
+        migrations.migrate(conn)
+    print(f"rendered markdown for {backfill(args.all)} recipes")
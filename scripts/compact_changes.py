@@ -0,0 +1,25 @@
+"""Compact the change log behind /changes.
+
+Usage: python -m scripts.compact_changes [--tombstone-days 30]
+
+Keeps only the newest entry per row, then drops delete tombstones older
+than --tombstone-days. Clients whose cursor is from before a dropped
+tombstone get a 410 from /changes and have to refetch everything, so
+pick a retention longer than the slowest client's polling interval.
+Safe to run from cron while the app is serving.
+"""
+import argparse
+
+import migrations
+from database import engine
+from utils import changes
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--tombstone-days", type=float, default=30.0)
+    args = parser.parse_args()
+
+    with engine.begin() as conn:
+        migrations.migrate(conn)
+        superseded, tombstones = changes.compact(conn, args.tombstone_days * 86400)
+    print(f"removed {superseded} superseded entries and {tombstones} tombstones")
@@ -0,0 +1,209 @@
+"""Render the public HTML fragments to a directory for static serving.
+
+Usage: python -m scripts.pregenerate [--out DIR] [--full] [--workers N]
+
+The layout mirrors the HTML endpoints:
+
+    recipes/all/{all,<tag id>}.html       /recipes/all/html?tag=...
+    recipes/one/<recipe id>.html          /recipes/one/html?id=...
+    recipes/tags.html                     /recipes/tags/html
+    reviews/all/{all,<cuisine id>}.html   /reviews/all/html?cuisine=...
+    reviews/cuisines.html                 /reviews/cuisines/html
+
+A manifest in the output directory records a fingerprint of every row the
+last build rendered. Later builds only re-render the outputs whose rows
+changed, were added or were removed, unless --full is given or there is no
+manifest yet. Full builds are spread over a process pool.
+"""
+import argparse, hashlib, json, os
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from sqlmodel import Session, select
+
+import migrations
+from database import engine
+from models import (
+    recipe as recipe_model,
+    review as review_model,
+    tag as tag_model,
+    cuisine as cuisine_model
+)
+from routers.recipes import RECIPE_ORDER
+from routers.reviews import REVIEW_ORDER
+from utils import (
+    generate_html as gen_html,
+    pagination as pagination,
+    reference as reference
+)
+
+PREGENERATE_WORKERS = int(os.getenv("PREGENERATE_WORKERS", str(os.cpu_count() or 1)))
+PAGE_BATCH_SIZE = 500
+MANIFEST = "manifest.json"
+
+def write(path: Path, html: str):
+    # written beside the target and renamed so a server never reads half a file
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(path.name + ".tmp")
+    tmp.write_text(html, encoding="utf-8")
+    os.replace(tmp, path)
+
+def remove(path: Path):
+    path.unlink(missing_ok=True)
+
+def fingerprint(row: dict):
+    return hashlib.sha1(json.dumps(row, sort_keys=True, default=str).encode("utf-8")).hexdigest()[:16]
+
+def recipe_grid(session: Session, out: Path, tag: str):
+    statement = select(recipe_model.Recipe)
+    if tag != "all":
+        statement = statement.where(recipe_model.Recipe.tag_id == int(tag))
+    recipes = session.exec(statement.order_by(*pagination.order_by(RECIPE_ORDER))).all()
+    write(out / "recipes" / "all" / f"{tag}.html", "".join(gen_html.generate_recipes(recipes)))
+    return 1
+
+def recipe_pages(session: Session, out: Path, ids: list[int]):
+    statement = select(recipe_model.Recipe).where(recipe_model.Recipe.id.in_(ids))
+    written = 0
+    for recipe in session.exec(statement):
+        write(out / "recipes" / "one" / f"{recipe.id}.html", gen_html.generate_recipe(recipe))
+        written += 1
+    return written
+
+def review_grid(session: Session, out: Path, cuisine: str):
+    statement = select(review_model.Review)
+    if cuisine != "all":
+        statement = statement.where(review_model.Review.cuisine_id == int(cuisine))
+    reviews = session.exec(statement.order_by(*pagination.order_by(REVIEW_ORDER))).all()
+    write(out / "reviews" / "all" / f"{cuisine}.html", "".join(gen_html.generate_reviews(reviews)))
+    return 1
+
+def tag_options(session: Session, out: Path):
+    write(out / "recipes" / "tags.html", gen_html.generate_tags(reference.tags.items()))
+    return 1
+
+def cuisine_options(session: Session, out: Path):
+    write(out / "reviews" / "cuisines.html", gen_html.generate_tags(reference.cuisines.items()))
+    return 1
+
+RENDERERS = {
+    "recipe_grid": recipe_grid,
+    "recipe_pages": recipe_pages,
+    "review_grid": review_grid,
+    "tag_options": tag_options,
+    "cuisine_options": cuisine_options,
+}
+
+def run_job(job: tuple):
+    kind, out, *args = job
+    with Session(engine) as session:
+        # each job may run in a fresh worker process, with nothing loaded
+        reference.load_sync(session)
+        return RENDERERS[kind](session, Path(out), *args)
+
+def snapshot(session: Session):
+    reference.load_sync(session)
+    recipes = session.exec(select(recipe_model.Recipe))
+    reviews = session.exec(select(review_model.Review))
+    tags = session.exec(select(tag_model.Tag)).all()
+    cuisines = session.exec(select(cuisine_model.Cuisine)).all()
+    # the tag or cuisine name is part of each row's print, so renaming a tag or
+    # cuisine marks every card that shows it as changed
+    return {
+        "recipes": {
+            str(recipe.id): [fingerprint({**recipe.model_dump(), "tag": reference.tags.name(recipe.tag_id)}), recipe.tag_id]
+            for recipe in recipes
+        },
+        "reviews": {
+            str(review.id): [fingerprint({**review.model_dump(), "cuisine": reference.cuisines.name(review.cuisine_id)}), review.cuisine_id]
+            for review in reviews
+        },
+        "tags": {str(tag.id): fingerprint(tag.model_dump()) for tag in tags},
+        "cuisines": {str(cuisine.id): fingerprint(cuisine.model_dump()) for cuisine in cuisines},
+    }
+
+EMPTY = {"recipes": {}, "reviews": {}, "tags": {}, "cuisines": {}}
+
+def changed(before: dict, after: dict):
+    """Ids whose print differs, and the groups they were or are now in."""
+    ids, groups, removed = [], set(), []
+    for row_id, (digest, group) in after.items():
+        previous = before.get(row_id)
+        if previous != [digest, group]:
+            ids.append(int(row_id))
+            groups.add(group)
+            if previous:
+                groups.add(previous[1])
+    for row_id, (_, group) in before.items():
+        if row_id not in after:
+            removed.append(row_id)
+            groups.add(group)
+    return ids, {str(group) for group in groups if group is not None}, removed
+
+def batches(ids: list[int]):
+    for start in range(0, len(ids), PAGE_BATCH_SIZE):
+        yield ids[start:start + PAGE_BATCH_SIZE]
+
+def plan_grids(out: Path, kind: str, options: str, before: dict, after: dict, full: bool):
+    rows, names = f"{kind}s", {"recipe": "tags", "review": "cuisines"}[kind]
+    ids, groups, removed = changed(before[rows], after[rows])
+    jobs, stale = [], []
+    if kind == "recipe":
+        # reviews only appear in grids, recipes also have a page each
+        jobs += [("recipe_pages", str(out), batch) for batch in batches(ids)]
+        stale += [out / "recipes" / "one" / f"{row_id}.html" for row_id in removed]
+    if before[names] != after[names] or full:
+        jobs.append((options, str(out)))
+        groups |= set(after[names]) ^ set(before[names])
+    if ids or removed or full:
+        groups.add("all")
+    for group in sorted(groups):
+        if group == "all" or group in after[names]:
+            jobs.append((f"{kind}_grid", str(out), group))
+        else:
+            stale.append(out / rows / "all" / f"{group}.html")
+    return jobs, stale
+
+def plan(out: Path, before: dict, after: dict, full: bool = False):
+    jobs, stale = [], []
+    for kind, options in (("recipe", "tag_options"), ("review", "cuisine_options")):
+        kind_jobs, kind_stale = plan_grids(out, kind, options, before, after, full)
+        jobs += kind_jobs
+        stale += kind_stale
+    return jobs, stale
+
+def build(out: Path, full: bool = False, workers: int = PREGENERATE_WORKERS):
+    manifest_path = out / MANIFEST
+    before = json.loads(manifest_path.read_text(encoding="utf-8")) if manifest_path.exists() else None
+    full = full or before is None
+
+    with Session(engine) as session:
+        after = snapshot(session)
+    if full:
+        jobs, _ = plan(out, EMPTY, after, full=True)
+        # files left over from rows that no longer exist
+        stale = plan(out, before, after)[1] if before else []
+    else:
+        jobs, stale = plan(out, before, after)
+
+    if full and workers > 1 and len(jobs) > 1:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            written = sum(pool.map(run_job, jobs))
+    else:
+        written = sum(run_job(job) for job in jobs)
+    for path in stale:
+        remove(path)
+
+    write(manifest_path, json.dumps(after))
+    return written, len(stale)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--out", default="public", help="output directory (default: public)")
+    parser.add_argument("--full", action="store_true", help="ignore the manifest and render everything")
+    parser.add_argument("--workers", type=int, default=PREGENERATE_WORKERS, help="processes for a full build")
+    args = parser.parse_args()
+
+    with engine.begin() as conn:
+        migrations.migrate(conn)
+    written, removed = build(Path(args.out), args.full, args.workers)
+    print(f"wrote {written} files, removed {removed} to {args.out}")
@@ -0,0 +1,132 @@
+"""Fill the database with synthetic tags, cuisines, recipes and reviews.
+
+Usage: python -m scripts.seed [--tags 8] [--cuisines 12] [--recipes 2000]
+           [--reviews 2000] [--random-seed 1] [--reset]
+
+Rows are generated from a seeded random source, so the same arguments
+always produce the same data. The database is the one DATABASE_FILE points
+at. A "bench" user with password "bench" is created for the auth routes.
+"""
+import argparse, random
+from sqlalchemy import delete, insert
+from sqlmodel import Session, select
+
+import migrations
+from database import engine
+from models import (
+    recipe as recipe_model,
+    review as review_model,
+    tag as tag_model,
+    cuisine as cuisine_model,
+    user as user_model
+)
+from utils import auth_util, markdown_util, slugs
+
+BATCH_SIZE = 1000
+BENCH_USER = "bench"
+BENCH_PASSWORD = "bench"
+
+TAG_NAMES = ["breakfast", "lunch", "dinner", "dessert", "snack", "soup", "salad", "sauce", "drink", "side", "bread", "meal prep"]
+CUISINE_NAMES = ["thai", "italian", "mexican", "japanese", "korean", "indian", "vietnamese", "french", "greek", "ethiopian",
+                 "lebanese", "chinese", "peruvian", "spanish", "turkish", "american"]
+ADJECTIVES = ["Spicy", "Smoky", "Crispy", "Creamy", "Garlicky", "Lemony", "Sticky", "Herby", "Charred", "Quick"]
+DISHES = ["Noodles", "Fried Rice", "Tacos", "Curry", "Stew", "Flatbread", "Dumplings", "Salad", "Chili", "Pasta", "Soup", "Bowl"]
+INGREDIENTS = ["garlic", "shallot", "ginger", "soy sauce", "fish sauce", "lime juice", "olive oil", "butter", "chicken thighs",
+               "tofu", "chickpeas", "rice noodles", "basil", "cilantro", "scallions", "chili flakes", "brown sugar", "stock"]
+UNITS = ["1 cup", "2 cups", "1 tbsp", "2 tbsp", "1 tsp", "1/2 tsp", "3 cloves", "1 lb", "200 g", "a handful of"]
+STEPS = ["Heat the oil in a large pan over medium-high heat.", "Add the aromatics and cook until **fragrant**, about a minute.",
+         "Stir in the sauce ingredients and bring to a simmer.", "Toss in the noodles and coat everything evenly.",
+         "Season to taste with salt and *plenty* of pepper.", "Rest for five minutes before serving.",
+         "Garnish with the herbs and serve right away."]
+STREETS = ["Main Street", "Broadway", "Elm Street", "Market Street", "2nd Avenue", "Harbor Road"]
+NOTES = ["Great noodles, slow service.", "Go for the lunch special.", "Loud on weekends but worth it.",
+         "Tiny place, cash only.", "The dumplings are the move.", ""]
+
+def ingredients_markdown(rng: random.Random):
+    lines = ["| Amount | Ingredient |", "| --- | --- |"]
+    for ingredient in rng.sample(INGREDIENTS, rng.randint(5, 10)):
+        lines.append(f"| {rng.choice(UNITS)} | {ingredient} |")
+    return "\n".join(lines)
+
+def instructions_markdown(rng: random.Random):
+    steps = rng.sample(STEPS, rng.randint(3, len(STEPS)))
+    return "\n".join(f"{number}. {step}" for number, step in enumerate(steps, 1))
+
+def recipe_row(rng: random.Random, number: int, tag_ids: list[int]):
+    row = {
+        "name": f"{rng.choice(ADJECTIVES)} {rng.choice(DISHES)} {number}",
+        "servings": rng.randint(1, 8),
+        "calories": rng.randint(150, 1200),
+        "protein": rng.randint(2, 80),
+        "ingredients": ingredients_markdown(rng),
+        "instructions": instructions_markdown(rng),
+        "tag_id": rng.choice(tag_ids),
+    }
+    return markdown_util.render_recipe_markdown_row(row)
+
+def review_row(rng: random.Random, number: int, cuisine_ids: list[int]):
+    return {
+        "name": f"{rng.choice(ADJECTIVES)} {rng.choice(CUISINE_NAMES).title()} Kitchen {number}",
+        "address": f"{rng.randint(1, 999)} {rng.choice(STREETS)}",
+        "visited": rng.random() < 0.6,
+        "rating": rng.randint(0, 5),
+        "notes": rng.choice(NOTES),
+        "cuisine_id": rng.choice(cuisine_ids),
+    }
+
+def insert_rows(session: Session, table, rows):
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) == BATCH_SIZE:
+            session.execute(insert(table), batch)
+            batch = []
+    if batch:
+        session.execute(insert(table), batch)
+
+def with_slugs(session: Session, table, rows):
+    taken = set(session.exec(select(table.slug).where(table.slug != None)).all())
+    for row in rows:
+        row["slug"] = slugs.next_free(slugs.base_slug(row["name"], table.__tablename__), taken)
+        taken.add(row["slug"])
+        yield row
+
+def names(base: list[str], count: int):
+    return [base[i % len(base)] + (f" {i // len(base) + 1}" if i >= len(base) else "") for i in range(count)]
+
+def seed(tags: int = 8, cuisines: int = 12, recipes: int = 2000, reviews: int = 2000,
+         random_seed: int = 1, reset: bool = False):
+    rng = random.Random(random_seed)
+    with Session(engine) as session:
+        if reset:
+            for table in (recipe_model.Recipe, review_model.Review, tag_model.Tag, cuisine_model.Cuisine):
+                session.execute(delete(table))
+
+        insert_rows(session, tag_model.Tag, ({"name": name} for name in names(TAG_NAMES, tags)))
+        insert_rows(session, cuisine_model.Cuisine, ({"name": name} for name in names(CUISINE_NAMES, cuisines)))
+        tag_ids = session.exec(select(tag_model.Tag.id)).all()
+        cuisine_ids = session.exec(select(cuisine_model.Cuisine.id)).all()
+
+        insert_rows(session, recipe_model.Recipe,
+                    with_slugs(session, recipe_model.Recipe, (recipe_row(rng, i, tag_ids) for i in range(recipes))))
+        insert_rows(session, review_model.Review,
+                    with_slugs(session, review_model.Review, (review_row(rng, i, cuisine_ids) for i in range(reviews))))
+
+        if not session.exec(select(user_model.User).where(user_model.User.username == BENCH_USER)).first():
+            session.add(user_model.User(username=BENCH_USER, password=auth_util.encrypt_password(BENCH_PASSWORD)))
+        session.commit()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--tags", type=int, default=8)
+    parser.add_argument("--cuisines", type=int, default=12)
+    parser.add_argument("--recipes", type=int, default=2000)
+    parser.add_argument("--reviews", type=int, default=2000)
+    parser.add_argument("--random-seed", type=int, default=1)
+    parser.add_argument("--reset", action="store_true", help="delete existing tags, cuisines, recipes and reviews first")
+    args = parser.parse_args()
+
+    with engine.begin() as conn:
+        migrations.migrate(conn)
+    seed(args.tags, args.cuisines, args.recipes, args.reviews, args.random_seed, args.reset)
+    print(f"seeded {args.tags} tags, {args.cuisines} cuisines, {args.recipes} recipes and {args.reviews} reviews")
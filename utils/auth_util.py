@@ -1,9 +1,12 @@
-import os, bcrypt
+import os, bcrypt, asyncio, threading, time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from typing import Annotated
-from fastapi import Depends
+from fastapi import Depends, HTTPException, status
 from datetime import datetime, timedelta, timezone
 from dotenv import load_dotenv
 from database import oauth2_scheme
+from utils import metrics
 
 import jwt
 
@@ -12,6 +15,19 @@ load_dotenv()
 SECRET_KEY = os.getenv("SECRET_KEY")
 ALGORITHM = os.getenv("ALGORITHM")
 ACCESS_TOKEN_EXPIRE_MINUTES = os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES")
+HASH_WORKERS = int(os.getenv("HASH_WORKERS", "2"))
+HASH_QUEUE_DEPTH = int(os.getenv("HASH_QUEUE_DEPTH", "8"))
+TOKEN_CACHE_MAX_ENTRIES = int(os.getenv("TOKEN_CACHE_MAX_ENTRIES", "1024"))
+
+# bcrypt releases the GIL, so a small dedicated pool keeps hashing off the
+# event loop without competing with the request threadpool
+_hash_pool = ThreadPoolExecutor(max_workers=HASH_WORKERS, thread_name_prefix="bcrypt")
+_hash_slots = threading.BoundedSemaphore(HASH_WORKERS + HASH_QUEUE_DEPTH)
+
+# verified token -> (claims, exp); only tokens that passed jwt.decode get in
+_token_cache: OrderedDict[str, tuple[dict, float]] = OrderedDict()
+_token_cache_lock = threading.Lock()
+_token_cache_stats = {"hits": 0, "misses": 0}
 
 def encrypt_password(password):
     return bcrypt.hashpw(password.encode("utf-8"), bcrypt.gensalt()).decode("utf-8")
@@ -19,6 +35,24 @@ def encrypt_password(password):
 def verify_password(plain_password, hashed_password):
     return bcrypt.checkpw(plain_password.encode("utf-8"), hashed_password.encode("utf-8"))
 
+async def run_in_hash_pool(func, *args):
+    if not _hash_slots.acquire(blocking=False):
+        raise HTTPException(
+            status_code=503,
+            detail="Too many login attempts in progress",
+            headers={"Retry-After": "1"},
+        )
+    try:
+        return await asyncio.get_running_loop().run_in_executor(_hash_pool, func, *args)
+    finally:
+        _hash_slots.release()
+
+async def encrypt_password_async(password):
+    return await run_in_hash_pool(encrypt_password, password)
+
+async def verify_password_async(plain_password, hashed_password):
+    return await run_in_hash_pool(verify_password, plain_password, hashed_password)
+
 def generate_token(
     username: str, expires_delta = ACCESS_TOKEN_EXPIRE_MINUTES
 ):
@@ -31,13 +65,53 @@ def generate_token(
 def decode_token(token):
     return jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
 
-def verify_token(token: Annotated[str, Depends(oauth2_scheme)]):
+def _get_cached_claims(token: str):
+    with _token_cache_lock:
+        entry = _token_cache.get(token)
+        if entry is not None:
+            claims, expires = entry
+            if expires > time.time():
+                _token_cache.move_to_end(token)
+                _token_cache_stats["hits"] += 1
+                return dict(claims)
+            # expired, fall through so jwt.decode produces the 401
+            del _token_cache[token]
+        _token_cache_stats["misses"] += 1
+    return None
+
+def _cache_claims(token: str, claims: dict):
+    expires = claims.get("exp")
+    if expires is None:
+        return
+    with _token_cache_lock:
+        _token_cache[token] = (dict(claims), float(expires))
+        _token_cache.move_to_end(token)
+        while len(_token_cache) > TOKEN_CACHE_MAX_ENTRIES:
+            _token_cache.popitem(last=False)
+
+def get_token_cache_stats():
+    with _token_cache_lock:
+        return {**_token_cache_stats, "size": len(_token_cache)}
+
+metrics.REGISTRY.extend([
+    metrics.Gauge("token_cache_hits_total", "verify_token calls answered from the claims cache.",
+                  lambda: get_token_cache_stats()["hits"], "counter"),
+    metrics.Gauge("token_cache_misses_total", "verify_token calls that had to decode the JWT.",
+                  lambda: get_token_cache_stats()["misses"], "counter"),
+    metrics.Gauge("token_cache_entries", "Verified tokens currently cached.", lambda: get_token_cache_stats()["size"]),
+])
+
+async def verify_token(token: Annotated[str, Depends(oauth2_scheme)]):
+    claims = _get_cached_claims(token)
+    if claims is not None:
+        return claims
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        return payload
-    except JWTError as e:
+    except jwt.PyJWTError as e:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Invalid or expired token",
             headers={"WWW-Authenticate": "Bearer"},
-        )
\ No newline at end of file
+        ) from e
+    _cache_claims(token, payload)
+    return payload
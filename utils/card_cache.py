@@ -0,0 +1,72 @@
+import os, sys
+from collections import OrderedDict
+from typing import Callable
+
+from utils import metrics
+
+CARD_CACHE_MAX_BYTES = int(os.getenv("CARD_CACHE_MAX_BYTES", str(16 * 1024 * 1024)))
+
+# only touched from the event loop, so no locking is needed
+_cards: OrderedDict = OrderedDict()
+_size = 0
+_hits = 0
+_misses = 0
+_evictions = 0
+
+lookups_total = metrics.Counter("card_cache_lookups_total", "Rendered card lookups by kind and result.", ("kind", "result"))
+evictions_total = metrics.Gauge("card_cache_evictions_total", "Cards evicted to stay under the byte limit.", lambda: _evictions, "counter")
+cache_bytes = metrics.Gauge("card_cache_bytes", "Memory held by cached cards.", lambda: _size)
+cache_entries = metrics.Gauge("card_cache_entries", "Cards currently cached.", lambda: len(_cards))
+metrics.REGISTRY.extend([lookups_total, evictions_total, cache_bytes, cache_entries])
+
+def _evict(key: tuple):
+    global _size
+    _size -= sys.getsizeof(_cards.pop(key))
+
+def get_or_render(key: tuple, render: Callable[[], str]) -> str:
+    """Return the card cached under key, rendering and storing it on a miss.
+
+    key starts with the kind and id, and must hold everything the card
+    shows that can change without the row's version moving.
+    """
+    global _size, _hits, _misses, _evictions
+    card = _cards.get(key)
+    if card is not None:
+        _cards.move_to_end(key)
+        _hits += 1
+        lookups_total.inc(key[0], "hit")
+        return card
+
+    _misses += 1
+    lookups_total.inc(key[0], "miss")
+    card = render()
+    size = sys.getsizeof(card)
+    if size > CARD_CACHE_MAX_BYTES:
+        return card
+    _cards[key] = card
+    _size += size
+    while _size > CARD_CACHE_MAX_BYTES:
+        _evict(next(iter(_cards)))
+        _evictions += 1
+    return card
+
+def discard(kind: str, row_id: int):
+    # a deleted row's id can be handed out again, starting over at version 1
+    for key in [key for key in _cards if key[0] == kind and key[1] == row_id]:
+        _evict(key)
+
+def clear():
+    global _size
+    _cards.clear()
+    _size = 0
+
+def stats():
+    lookups = _hits + _misses
+    return {
+        "hits": _hits,
+        "misses": _misses,
+        "hit_ratio": _hits / lookups if lookups else 0.0,
+        "evictions": _evictions,
+        "entries": len(_cards),
+        "bytes": _size,
+    }
@@ -0,0 +1,174 @@
+import time
+from sqlalchemy import func
+from sqlmodel import select
+
+from models import (
+    change as change_model,
+    recipe as recipe_model,
+    review as review_model,
+    tag as tag_model,
+    cuisine as cuisine_model
+)
+from utils import serialize
+
+Change = change_model.Change
+
+# every table the feed covers; the entity name is the table name
+TABLES = ("recipe", "review", "tag", "cuisine")
+# rows that nest another table's name, by the nested table: (table, foreign key)
+DEPENDENTS = {"tag": ("recipe", "tag_id"), "cuisine": ("review", "cuisine_id")}
+NOW = "CAST(strftime('%s', 'now') AS INTEGER)"
+
+def _trigger_ddl(table: str):
+    append = f"INSERT INTO change (entity, entity_id, op, changed_at) VALUES ('{table}', {{row}}.id, '{{op}}', {NOW});"
+    return [
+        f"""CREATE TRIGGER IF NOT EXISTS {table}_change_ai AFTER INSERT ON {table} BEGIN
+            {append.format(row="new", op="upsert")}
+        END""",
+        f"""CREATE TRIGGER IF NOT EXISTS {table}_change_au AFTER UPDATE ON {table} BEGIN
+            {append.format(row="new", op="upsert")}
+        END""",
+        f"""CREATE TRIGGER IF NOT EXISTS {table}_change_ad AFTER DELETE ON {table} BEGIN
+            {append.format(row="old", op="delete")}
+        END""",
+    ]
+
+def create_change_log(conn):
+    # AUTOINCREMENT, so a cursor is never handed out twice, even after
+    # compaction has deleted the newest entries
+    conn.exec_driver_sql("""CREATE TABLE change (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        entity VARCHAR NOT NULL,
+        entity_id INTEGER NOT NULL,
+        op VARCHAR NOT NULL,
+        changed_at INTEGER NOT NULL
+    )""")
+    conn.exec_driver_sql("""CREATE TABLE change_horizon (
+        id INTEGER NOT NULL,
+        horizon INTEGER NOT NULL,
+        PRIMARY KEY (id)
+    )""")
+    conn.exec_driver_sql("INSERT INTO change_horizon (id, horizon) VALUES (1, 0)")
+    for table in TABLES:
+        # the rows written before the log existed, so since=0 is a full sync
+        conn.exec_driver_sql(
+            f"INSERT INTO change (entity, entity_id, op, changed_at) "
+            f"SELECT '{table}', id, 'upsert', {NOW} FROM {table} ORDER BY id"
+        )
+        # triggers rather than calls in the handlers, so bulk imports and
+        # scripts writing behind the app's back are logged too, in the same
+        # transaction as the write
+        for statement in _trigger_ddl(table):
+            conn.exec_driver_sql(statement)
+
+def log_dependent_rows(conn):
+    # a recipe's entry carries its tag's name, so deleting or renaming a tag
+    # changes every recipe under it without touching their rows
+    for table, (dependent, foreign_key) in DEPENDENTS.items():
+        append = (
+            f"INSERT INTO change (entity, entity_id, op, changed_at) "
+            f"SELECT '{dependent}', id, 'upsert', {NOW} FROM {dependent} WHERE {foreign_key} = {{row}}.id;"
+        )
+        conn.exec_driver_sql(f"""CREATE TRIGGER IF NOT EXISTS {table}_change_au_{dependent} AFTER UPDATE OF name ON {table}
+            WHEN old.name IS NOT new.name BEGIN
+            {append.format(row="new")}
+        END""")
+        conn.exec_driver_sql(f"""CREATE TRIGGER IF NOT EXISTS {table}_change_ad_{dependent} AFTER DELETE ON {table} BEGIN
+            {append.format(row="old")}
+        END""")
+        # the rows whose nested tag or cuisine was deleted before this
+        # migration; clients still hold them with the old name
+        conn.exec_driver_sql(
+            f"INSERT INTO change (entity, entity_id, op, changed_at) "
+            f"SELECT '{dependent}', id, 'upsert', {NOW} FROM {dependent} "
+            f"WHERE {foreign_key} IS NOT NULL AND {foreign_key} NOT IN (SELECT id FROM {table}) ORDER BY id"
+        )
+
+def compact(conn, tombstone_seconds: float):
+    """Drop superseded entries, then tombstones older than tombstone_seconds.
+
+    A reader only ever gets an entity's newest entry, so dropping the older
+    ones changes no answer. Dropping a tombstone does: cursors from before
+    it would miss the delete, so the horizon moves past it and those
+    cursors are refused from then on.
+    """
+    superseded = conn.exec_driver_sql(
+        "DELETE FROM change WHERE id NOT IN (SELECT MAX(id) FROM change GROUP BY entity, entity_id)"
+    ).rowcount
+    cutoff = int(time.time() - tombstone_seconds)
+    newest = conn.exec_driver_sql(
+        "SELECT MAX(id) FROM change WHERE op = 'delete' AND changed_at < ?", (cutoff,)
+    ).scalar()
+    tombstones = 0
+    if newest is not None:
+        tombstones = conn.exec_driver_sql(
+            "DELETE FROM change WHERE op = 'delete' AND id <= ?", (newest,)
+        ).rowcount
+        conn.exec_driver_sql("UPDATE change_horizon SET horizon = MAX(horizon, ?) WHERE id = 1", (newest,))
+    return superseded, tombstones
+
+async def head_and_horizon(session):
+    # compaction can drop the newest entry only as an expired tombstone, and
+    # the horizon then moves up to it, so the larger of the two is the last
+    # cursor handed out; together they change whenever any answer does
+    newest = select(func.max(Change.id)).scalar_subquery()
+    latest, horizon = (await session.exec(select(newest, change_model.ChangeHorizon.horizon))).one()
+    return max(latest or 0, horizon), horizon
+
+def latest_statement(since: int, limit: int):
+    # SQLite fills the bare columns from the row MAX() picked, i.e. each
+    # entity's newest entry; the range scan is over the primary key, so a
+    # poll costs what changed since the cursor, not the catalogue size
+    latest = func.max(Change.id).label("cursor")
+    return (
+        select(latest, Change.entity, Change.entity_id, Change.op)
+        .where(Change.id > since)
+        .group_by(Change.entity, Change.entity_id)
+        .order_by(latest)
+        .limit(limit)
+    )
+
+def _named_rows(table, public):
+    fields = list(public.model_fields)
+
+    async def rows(session, ids: list[int]):
+        result = await session.exec(select(table.id, table.name).where(table.id.in_(ids)))
+        return {row_id: {field: {"id": row_id, "name": name}[field] for field in fields} for row_id, name in result}
+    return rows
+
+def _nested_rows(shape: serialize.NestedList, table):
+    async def rows(session, ids: list[int]):
+        result = (await session.exec(shape.select().where(table.id.in_(ids)))).all()
+        return {item["id"]: item for item in shape.dicts(result)}
+    return rows
+
+CURRENT_ROWS = {
+    "recipe": _nested_rows(serialize.recipes_with_tag, recipe_model.Recipe),
+    "review": _nested_rows(serialize.reviews_with_cuisine, review_model.Review),
+    "tag": _named_rows(tag_model.Tag, tag_model.TagPublic),
+    "cuisine": _named_rows(cuisine_model.Cuisine, cuisine_model.CuisinePublic),
+}
+
+async def read(session, since: int, limit: int):
+    """The changes after since, newest entry per entity, oldest first.
+
+    Upserts carry the row as the /all/ listings would return it. Returns
+    the changes, the cursor to resume from and whether more are waiting.
+    """
+    entries = (await session.exec(latest_statement(since, limit + 1))).all()
+    more = len(entries) > limit
+    entries = entries[:limit]
+
+    upserted: dict[str, list[int]] = {}
+    for entry in entries:
+        if entry.op == "upsert":
+            upserted.setdefault(entry.entity, []).append(entry.entity_id)
+    current = {entity: await CURRENT_ROWS[entity](session, ids) for entity, ids in upserted.items()}
+
+    changes = []
+    for entry in entries:
+        data = current.get(entry.entity, {}).get(entry.entity_id) if entry.op == "upsert" else None
+        # read in the same snapshot as the log, so this is only a guard
+        op = entry.op if entry.op == "delete" or data is not None else "delete"
+        changes.append({"cursor": entry.cursor, "entity": entry.entity, "id": entry.entity_id, "op": op, "data": data})
+    return changes, (entries[-1].cursor if entries else since), more
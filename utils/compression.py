@@ -0,0 +1,187 @@
+import asyncio, gzip, os, zlib
+import brotli, zstandard
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import HTMLResponse, Response
+from starlette.datastructures import Headers, MutableHeaders
+
+from utils import html_cache
+
+COMPRESSION_MINIMUM_SIZE = int(os.getenv("COMPRESSION_MINIMUM_SIZE", "500"))
+# bodies above this are precompressed at the dynamic level; max-level
+# brotli on a few hundred KB costs whole seconds of CPU
+PRECOMPRESS_MAX_SIZE = int(os.getenv("PRECOMPRESS_MAX_SIZE", str(128 * 1024)))
+COMPRESSIBLE_TYPES = ("text/html", "application/json", "application/x-ndjson")
+
+# server preference when the client rates several encodings equally
+ENCODINGS = ("br", "zstd", "gzip")
+# per-request compression favours speed, cached bodies are compressed once
+DYNAMIC_LEVELS = {"br": 4, "zstd": 3, "gzip": 6}
+MAX_LEVELS = {"br": 11, "zstd": 19, "gzip": 9}
+
+def negotiate(accept_encoding: str | None):
+    if not accept_encoding:
+        return None
+    weights = {}
+    for part in accept_encoding.split(","):
+        name, _, params = part.strip().partition(";")
+        weight = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                weight = float(params[2:])
+            except ValueError:
+                weight = 0.0
+        weights[name.strip().lower()] = weight
+
+    best, best_weight = None, 0.0
+    for encoding in ENCODINGS:
+        weight = weights.get(encoding, weights.get("*", 0.0))
+        if weight > best_weight:
+            best, best_weight = encoding, weight
+    return best
+
+def compress(data: bytes, encoding: str, level: int):
+    if encoding == "br":
+        return brotli.compress(data, quality=level)
+    if encoding == "zstd":
+        return zstandard.ZstdCompressor(level=level).compress(data)
+    return gzip.compress(data, compresslevel=level)
+
+class StreamCompressor:
+    def __init__(self, encoding: str, level: int):
+        self.encoding = encoding
+        if encoding == "br":
+            self._compressor = brotli.Compressor(quality=level)
+        elif encoding == "zstd":
+            self._compressor = zstandard.ZstdCompressor(level=level).compressobj()
+        else:
+            self._compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+
+    def compress(self, data: bytes):
+        # flushed per chunk so a streamed grid still reaches the client card
+        # by card instead of waiting for the compressor's buffer to fill
+        if self.encoding == "br":
+            return self._compressor.process(data) + self._compressor.flush()
+        if self.encoding == "zstd":
+            return self._compressor.compress(data) + self._compressor.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK)
+        return self._compressor.compress(data) + self._compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self):
+        if self.encoding == "br":
+            return self._compressor.finish()
+        return self._compressor.flush()
+
+def encoded_etag(etag: str, encoding: str):
+    # a strong ETag names one exact byte sequence, so each encoding gets its own
+    return etag[:-1] + f'-{encoding}"' if etag.endswith('"') else etag
+
+def strip_encoding(etag: str):
+    for encoding in ENCODINGS:
+        suffix = f'-{encoding}"'
+        if etag.endswith(suffix):
+            return etag[:-len(suffix)] + '"'
+    return etag
+
+_precompressing: dict[tuple, asyncio.Task] = {}
+
+def _precompress_later(key: tuple, body: str, encoding: str):
+    if (key, encoding) in _precompressing:
+        return
+
+    raw = body.encode("utf-8")
+    level = (MAX_LEVELS if len(raw) <= PRECOMPRESS_MAX_SIZE else DYNAMIC_LEVELS)[encoding]
+
+    async def run():
+        try:
+            data = await run_in_threadpool(compress, raw, encoding, level)
+            html_cache.set_variant(key, encoding, data)
+        finally:
+            _precompressing.pop((key, encoding), None)
+
+    _precompressing[(key, encoding)] = asyncio.get_running_loop().create_task(run())
+
+def cached_response(request, key: tuple, body: str, headers: dict | None = None, precompress: bool = False):
+    # only callers whose keys come from a small, known set pass precompress;
+    # anything else is left to the middleware, so arbitrary query strings
+    # cannot queue up background compression work
+    encoding = negotiate(request.headers.get("accept-encoding"))
+    data = None
+    if precompress and encoding and len(body) >= COMPRESSION_MINIMUM_SIZE:
+        data = html_cache.get_variant(key, encoding)
+        if data is None:
+            # max-level brotli is too slow to make this client wait for, so
+            # it gets the dynamic encoding and later hits get the stored one
+            _precompress_later(key, body, encoding)
+    if data is None:
+        return HTMLResponse(content=body, headers=headers)
+
+    headers = dict(headers or {})
+    if "ETag" in headers:
+        headers["ETag"] = encoded_etag(headers["ETag"], encoding)
+    headers["Content-Encoding"] = encoding
+    return Response(content=data, media_type="text/html", headers=headers)
+
+class CompressionMiddleware:
+    def __init__(self, app, minimum_size: int = COMPRESSION_MINIMUM_SIZE):
+        self.app = app
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        encoding = negotiate(Headers(scope=scope).get("accept-encoding"))
+        responder = _CompressionResponder(send, encoding, self.minimum_size)
+        await self.app(scope, receive, responder.send)
+
+class _CompressionResponder:
+    def __init__(self, send, encoding: str | None, minimum_size: int):
+        self._send = send
+        self.encoding = encoding
+        self.minimum_size = minimum_size
+        self.start = None
+        self.compressor = None
+
+    async def send(self, message):
+        if message["type"] == "http.response.start":
+            # held back until the first body chunk shows whether it is worth it
+            self.start = message
+            return
+        if message["type"] != "http.response.body" or self.start is None:
+            if self.compressor is not None and message["type"] == "http.response.body":
+                body = self.compressor.compress(message.get("body", b""))
+                if not message.get("more_body", False):
+                    body += self.compressor.finish()
+                message = {**message, "body": body}
+            await self._send(message)
+            return
+
+        start, self.start = self.start, None
+        headers = MutableHeaders(raw=start["headers"])
+        body = message.get("body", b"")
+        more_body = message.get("more_body", False)
+        content_type = headers.get("content-type", "").split(";")[0].strip()
+
+        compressible = content_type in COMPRESSIBLE_TYPES and start["status"] not in (204, 304)
+        if compressible:
+            # identity responses vary too, or a shared cache could hand them
+            # to clients that asked for a compressed body and vice versa
+            headers.add_vary_header("Accept-Encoding")
+        if (not compressible or self.encoding is None or "content-encoding" in headers
+                or (not more_body and len(body) < self.minimum_size)):
+            await self._send(start)
+            await self._send(message)
+            return
+
+        headers["Content-Encoding"] = self.encoding
+        if "etag" in headers:
+            headers["ETag"] = encoded_etag(headers["etag"], self.encoding)
+        if not more_body:
+            body = compress(body, self.encoding, DYNAMIC_LEVELS[self.encoding])
+            headers["Content-Length"] = str(len(body))
+        else:
+            del headers["Content-Length"]
+            self.compressor = StreamCompressor(self.encoding, DYNAMIC_LEVELS[self.encoding])
+            body = self.compressor.compress(body)
+        await self._send(start)
+        await self._send({**message, "body": body})
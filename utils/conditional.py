@@ -0,0 +1,57 @@
+import hashlib, os
+from email.utils import formatdate, parsedate_to_datetime
+from fastapi import Depends, HTTPException, Request
+
+from utils import compression, versions
+
+READ_CACHE_CONTROL = os.getenv("READ_CACHE_CONTROL", "public, no-cache")
+
+def _digest(request: Request, state: str):
+    query = "&".join(sorted(f"{key}={value}" for key, value in request.query_params.multi_items()))
+    fingerprint = f"{request.url.path}?{query}|{state}"
+    return hashlib.sha1(fingerprint.encode("utf-8")).hexdigest()[:20]
+
+def validators(request: Request, tables: tuple[str, ...]):
+    # strong ETag: one per representation, i.e. per path, query and the
+    # versions of every table the response is built from; the versions are
+    # read from the change log, so every process agrees on them
+    return {
+        "ETag": f'"{_digest(request, versions.current(*tables))}"',
+        "Last-Modified": formatdate(versions.last_modified(*tables), usegmt=True),
+        "Cache-Control": READ_CACHE_CONTROL,
+    }
+
+def state_validators(request: Request, state: str):
+    # for responses that read their state in their own session rather than
+    # from the table versions; there is no Last-Modified
+    return {
+        "ETag": f'"{_digest(request, state)}"',
+        "Cache-Control": READ_CACHE_CONTROL,
+    }
+
+def is_not_modified(request: Request, headers: dict):
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        # compressed responses carry the encoding in their ETag, but the
+        # validator underneath is the same
+        tags = {compression.strip_encoding(tag.strip().removeprefix("W/")) for tag in if_none_match.split(",")}
+        return "*" in tags or headers["ETag"] in tags
+
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since is not None and "Last-Modified" in headers:
+        try:
+            since = parsedate_to_datetime(if_modified_since).timestamp()
+        except (TypeError, ValueError):
+            return False
+        return parsedate_to_datetime(headers["Last-Modified"]).timestamp() <= since
+    return False
+
+def validate(*tables: str):
+    # runs as a dependency, i.e. before the handler touches the database
+    async def dependency(request: Request):
+        headers = validators(request, tables)
+        if is_not_modified(request, headers):
+            raise HTTPException(status_code=304, headers=headers)
+        return headers
+
+    return Depends(dependency)
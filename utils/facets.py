@@ -0,0 +1,149 @@
+from typing import Annotated, Literal
+from fastapi import HTTPException, Query
+from sqlalchemy import and_, case, func, true
+from sqlmodel import select
+
+from models import recipe as recipe_model
+from utils import pagination, reference
+
+Recipe = recipe_model.Recipe
+
+# every order ends in the id, so keyset pagination has a unique position;
+# the nutrition columns' own indexes end in the rowid too, so those sorts
+# are walked straight off the index in either direction
+RECIPE_SORTS = {
+    "name": [(Recipe.name, False), (Recipe.id, False)],
+    "-name": [(Recipe.name, True), (Recipe.id, True)],
+    "calories": [(Recipe.calories, False), (Recipe.id, False)],
+    "-calories": [(Recipe.calories, True), (Recipe.id, True)],
+    "protein": [(Recipe.protein, False), (Recipe.id, False)],
+    "-protein": [(Recipe.protein, True), (Recipe.id, True)],
+    "servings": [(Recipe.servings, False), (Recipe.id, False)],
+    "-servings": [(Recipe.servings, True), (Recipe.id, True)],
+}
+RecipeSort = Literal["name", "-name", "calories", "-calories", "protein", "-protein", "servings", "-servings"]
+
+# upper edges of the facet buckets; the last bucket is open-ended
+NUTRITION_BUCKETS = {
+    "servings": (2, 4, 6),
+    "calories": (300, 600, 900),
+    "protein": (15, 30, 45),
+}
+
+class RecipeFilters:
+    def __init__(self, tags: list[int], ranges: dict[str, tuple[int | None, int | None]]):
+        self.tags = tags
+        self.ranges = ranges
+
+    def range_clause(self, name: str):
+        low, high = self.ranges[name]
+        column = getattr(Recipe, name)
+        clauses = []
+        if low is not None:
+            clauses.append(column >= low)
+        if high is not None:
+            clauses.append(column <= high)
+        return and_(*clauses) if clauses else true()
+
+    def apply(self, statement):
+        if self.tags:
+            statement = statement.where(Recipe.tag_id.in_(self.tags))
+        for name, (low, high) in self.ranges.items():
+            if low is not None or high is not None:
+                statement = statement.where(self.range_clause(name))
+        return statement
+
+    def tag_only(self):
+        # at most one tag and no ranges: one shape per tag, a bounded set
+        return len(set(self.tags)) <= 1 and all(
+            low is None and high is None for low, high in self.ranges.values()
+        )
+
+    def cache_params(self):
+        return {"tags": tuple(sorted(set(self.tags))), **self.ranges}
+
+def parse_tags(tag: list[str]):
+    # "all" is what the front end sends for no tag filter
+    tags = []
+    for value in tag:
+        if value == "all":
+            continue
+        try:
+            tag_id = int(value)
+        except ValueError:
+            raise HTTPException(status_code=422, detail=f"Invalid tag id: {value!r}")
+        if not pagination.INT64_MIN <= tag_id <= pagination.INT64_MAX:
+            raise HTTPException(status_code=422, detail=f"Invalid tag id: {value!r}")
+        tags.append(tag_id)
+    return tags
+
+def recipe_filters(
+    tag: Annotated[list[str], Query()] = [],
+    servings_min: Annotated[int | None, Query(ge=0, le=pagination.INT64_MAX)] = None,
+    servings_max: Annotated[int | None, Query(ge=0, le=pagination.INT64_MAX)] = None,
+    calories_min: Annotated[int | None, Query(ge=0, le=pagination.INT64_MAX)] = None,
+    calories_max: Annotated[int | None, Query(ge=0, le=pagination.INT64_MAX)] = None,
+    protein_min: Annotated[int | None, Query(ge=0, le=pagination.INT64_MAX)] = None,
+    protein_max: Annotated[int | None, Query(ge=0, le=pagination.INT64_MAX)] = None,
+):
+    ranges = {
+        "servings": (servings_min, servings_max),
+        "calories": (calories_min, calories_max),
+        "protein": (protein_min, protein_max),
+    }
+    for name, (low, high) in ranges.items():
+        if low is not None and high is not None and low > high:
+            raise HTTPException(status_code=422, detail=f"{name}_min is greater than {name}_max")
+    return RecipeFilters(parse_tags(tag), ranges)
+
+def _buckets(edges: tuple[int, ...]):
+    lows = (None,) + edges
+    highs = tuple(edge - 1 for edge in edges) + (None,)
+    return list(zip(lows, highs))
+
+def _in_bucket(column, low: int | None, high: int | None):
+    clauses = []
+    if low is not None:
+        clauses.append(column >= low)
+    if high is not None:
+        clauses.append(column <= high)
+    return and_(*clauses)
+
+def _count(*clauses):
+    return func.sum(case((and_(*clauses), 1), else_=0))
+
+def facet_statement(filters: RecipeFilters):
+    """One row per tag, with the counts every facet needs.
+
+    Each facet is counted under every filter except its own, so picking a
+    bucket doesn't zero out the others in its group. The tag filter is left
+    out of the query and applied to the rows afterwards for the same reason.
+    """
+    ranges = {name: filters.range_clause(name) for name in NUTRITION_BUCKETS}
+    columns = [Recipe.tag_id, _count(*ranges.values())]
+    for name, edges in NUTRITION_BUCKETS.items():
+        others = [clause for other, clause in ranges.items() if other != name]
+        column = getattr(Recipe, name)
+        columns.extend(_count(*others, _in_bucket(column, low, high)) for low, high in _buckets(edges))
+    return select(*columns).group_by(Recipe.tag_id)
+
+def facet_counts(rows, filters: RecipeFilters):
+    selected = set(filters.tags)
+    matching = [row for row in rows if not selected or row[0] in selected]
+    names = {row[0]: reference.tags.name(row[0]) for row in rows}
+    facets = {
+        "total": sum(row[1] or 0 for row in matching),
+        # recipes without a (surviving) tag count towards the total only
+        "tags": sorted(
+            ({"id": row[0], "name": names[row[0]], "count": row[1] or 0} for row in rows if names[row[0]] is not None),
+            key=lambda tag: (tag["name"], tag["id"]),
+        ),
+    }
+    index = 2
+    for name, edges in NUTRITION_BUCKETS.items():
+        facets[name] = []
+        for low, high in _buckets(edges):
+            count = sum(row[index] or 0 for row in matching)
+            facets[name].append({"min": low, "max": high, "count": count})
+            index += 1
+    return facets
@@ -1,5 +1,7 @@
-import re
-import markdown
+import os, re
+from typing import Iterable
+from jinja2 import Environment, FileSystemLoader
+from jinja2.ext import Extension
 
 from models import (
     tag as tag_model,
@@ -7,279 +9,88 @@ from models import (
     recipe as recipe_model,
     review as review_model
 )
+from utils import card_cache, reference, slugs
+from utils.metrics import timed_render
+
+TEMPLATE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "templates")
+
+class StripWhitespace(Extension):
+    # runs on the template source before compilation, so the indentation
+    # kept in templates/ for readability never reaches a response
+    def preprocess(self, source, name, filename=None):
+        source = " ".join(line.strip() for line in source.splitlines() if line.strip())
+        source = re.sub(r">\s+<", "><", source)
+        source = re.sub(r">\s+({[%{])", r">\1", source)
+        return re.sub(r"([%}]})\s+<", r"\1<", source)
+
+env = Environment(
+    loader=FileSystemLoader(TEMPLATE_DIR),
+    autoescape=True,
+    auto_reload=False,
+    extensions=[StripWhitespace],
+)
 
-def generate_slug(string: str):
-    string = string.lower()
-    string = re.sub(r'[^a-z0-9\s-]', '', string)
-    string = re.sub(r'[\s-]+', '-', string).strip('-')
+options_template = env.get_template("options.html")
+# the per-row fragments are macros, called straight from Python: that
+# skips the context Template.render builds on every call, and the
+# arguments are plain locals inside the macro rather than attribute lookups
+stars_macro = env.get_template("stars.html").module.stars
+recipe_card_macro = env.get_template("recipe_card.html").module.recipe_card
+review_card_macro = env.get_template("review_card.html").module.review_card
+recipe_template = env.get_template("recipe.html")
+error_template = env.get_template("error.html")
 
-    return string
+def generate_slug(string: str):
+    return slugs.slugify(string)
+
+def recipe_slug(recipe: recipe_model.Recipe):
+    # stored since the slug migration; only unsaved rows are slugged here
+    return recipe.slug or generate_slug(recipe.name)
+
+def recipe_card(recipe: recipe_model.Recipe):
+    tag_name = reference.tags.name(recipe.tag_id) or ""
+    render = lambda: str(recipe_card_macro(
+        recipe.id, recipe.name, recipe.servings, recipe.calories, recipe.protein, recipe_slug(recipe), tag_name
+    ))
+    if recipe.id is None:
+        return render()
+    # the tag's name isn't covered by the recipe's version
+    return card_cache.get_or_render(("recipe", recipe.id, recipe.version, tag_name), render)
+
+def review_card(review: review_model.Review):
+    cuisine_name = reference.cuisines.name(review.cuisine_id) or ""
+    render = lambda: str(review_card_macro(
+        review.name, review.visited, review.rating, review.address, review.notes, cuisine_name
+    ))
+    if review.id is None:
+        return render()
+    return card_cache.get_or_render(("review", review.id, review.version, cuisine_name), render)
 
 def generate_stars(rating: int):
-    gen_html = ""
-
-    for i in range(rating):
-        gen_html += f"""
-            <span key={i} className="icon">
-                <i class="fa-solid fa-star" style="color: gold;"></i>
-                </span>
-            """
-    
-    return gen_html
-
-def generate_markdown(string: str):
-    return markdown.markdown(string, extensions=['tables'])
-
-def generate_tags(tags: list[tag_model.Tag]):
-    gen_html = """
-        <option value="all" selected>Select Filter</option>
-    """
-
-    for tag in tags:
-        gen_html += f"""
-            <option value={tag.id}>{tag.name}</option>
-        """
-
-    return gen_html
-
-def generate_cuisines(cuisines: list[cuisine_model.Cuisine]):
-    gen_html = """
-        <option value="all" selected>Select Filter</option>
-    """
+    return str(stars_macro(rating))
 
-    for cuisine in cuisines:
-        gen_html += f"""
-            <option value={cuisine.id}>{cuisine.name}</option>
-        """
-    
-    return gen_html
+@timed_render
+def generate_tags(tags: Iterable[tag_model.Tag | dict]):
+    return options_template.render(items=tags)
 
-def generate_recipes(recipes: list[recipe_model.Recipe]):
-    gen_html = ""
+@timed_render
+def generate_cuisines(cuisines: Iterable[cuisine_model.Cuisine | dict]):
+    return options_template.render(items=cuisines)
 
-    if (len(recipes) > 0):
+@timed_render
+def generate_recipes(recipes: Iterable[recipe_model.Recipe]):
+    for recipe in recipes:
+        yield recipe_card(recipe)
 
-        for recipe in recipes:
-            slug = generate_slug(recipe.name)
-            gen_html += f"""
-                <div class="cell">
-                    <div class="card" style="height: 100%;">
-                        <div class="card-image">
-                            <figure class="image is-4by3">
-                            <img
-                                style="object-fit: cover"
-                                src="/static/img/{slug}.jpg"
-                                onerror="this.src='/static/img/image-not-found.jpg'"
-                                alt="{recipe.name} image"
-                            />
-                            </figure>
-                        </div>
-                        <div class="card-content">
-                            <div class="media">
-                            <div class="media-content" style="min-height: 5rem">
-                                <p class="title is-4">{recipe.name}</p>
-                                <p class="subtitle is-6"><span class="tag is-warning">{recipe.tag.name}</span></p>
-                            </div>
-                            </div>
-
-                            <div class="content" style="max-height: 8rem; min-height: 6rem;" >
-                            <nav class="level is-mobile">
-                                <div class="level-item has-text-centered">
-                                    <div>
-                                        <p class="title is-5">{recipe.servings}</p>
-                                        <p class="title is-6">SERVINGS</p>
-                                    </div>
-                                </div>
-                                <div class="level-item has-text-centered">
-                                    <div>
-                                        <p class="title is-5">{recipe.calories}</p>
-                                        <p class="title is-6">CALORIES</p>
-                                    </div>
-                                </div>
-                                <div class="level-item has-text-centered">
-                                    <div>
-                                        <p class="title is-5">{recipe.protein}g</p>
-                                        <p class="title is-6">PROTEIN</p>
-                                    </div>
-                                </div>
-                            </nav>
-                            <br />
-                            </div>
-                            
-                            <nav class="level">
-                                <div class="level-item">
-                                    <a href="/view-recipe.htm?id={recipe.id}&name={recipe.name}">
-                                        <button class="button is-primary">View Recipe</button>
-                                    </a>
-                                </div>
-                            </nav>
-                        </div>
-                    </div>
-                </div>
-            """
-
-        return gen_html
-
-    return gen_html
-
-def generate_reviews(reviews: list[review_model.Review]):
-    gen_html = ""
-    
-    if (len(reviews) > 0):
-        
-        for review in reviews:
-            slug = generate_slug(review.name)
-            if review.rating:
-                rating = generate_stars(review.rating)
-            else: rating = ""
-
-            if review.visited:
-                text = """
-                <div class="icon-text">
-                    <span class="title is-6">
-                        <span key={i} class="icon has-text-primary">
-                            <i class="fa-solid fa-check"></i>
-                        </span>
-                    </span>
-                </div>
-                """
-            else:
-                text = """
-                <div class="icon-text">
-                    
-                    <span class="title is-6">
-                        <span key={i} class="icon has-text-danger">
-                            <i class="fa-solid fa-ban"></i>
-                        </span>
-                    </span>
-                </div>
-                """
-            
-            gen_html += f"""
-                <div class="cell">
-                    <div class="card" style="height: 100%;">
-                        <div class="card-header">
-                            <div class="card-header-title">
-                                <p class="title is-4">{review.name}</p>
-                            </div>
-                            <div class="card-header-icon">
-                                    <div>
-                                        {text}
-                                    </div>
-                            </div>
-                        </div>
-                        <div class="card-content">
-                            <div class="content" min-height: 6rem;" >
-                                <div class="has-text-centered">
-                                    <div>
-                                        {rating}
-                                    </div>
-                                </div>
-                                <nav class="level">
-                                    <div class="level-item has-text-centered">
-                                        <div>
-                                            <p class="title is-6">{review.address}</p>
-                                        </div>
-                                    </div>
-                                </nav>
-                                <div class="has-text-centered">
-                                    <span class="tag is-primary"><span class="title is-6">{review.cuisine.name.capitalize()}</span></span>
-                                </div>
-                            <br />
-                            <p>
-                                {review.notes}
-                            </p>
-                            </div>
-                        </div>
-                    </div>
-                </div>
-            """
-
-    return gen_html
+@timed_render
+def generate_reviews(reviews: Iterable[review_model.Review]):
+    for review in reviews:
+        yield review_card(review)
 
+@timed_render
 def generate_error_html():
-    return """
-    <article class="message is-danger">
-        <div class="message-header">
-            <p>Error</p>
-        </div>
-        <div class="message-body">
-            There was a problem getting this recipe, or this recipe does not exist.
-        </div>
-    </article>
-    """
-
+    return error_template.render()
 
+@timed_render
 def generate_recipe(recipe: recipe_model.Recipe):
-    slug = generate_slug(recipe.name)
-    ingredients = generate_markdown(recipe.ingredients)
-    instructions = generate_markdown(recipe.instructions)
-
-    gen_html = f"""
-        <div class="card" style="margin: 0rem 1rem" >
-            <div class="card-image">
-                <figure class="image is-4by3">
-                <img
-                    style="object-fit: cover"
-                    src="/static/img/{slug}.jpg"
-                    onerror="this.src='/static/img/image-not-found.jpg'"
-                    alt="{recipe.name} image"
-                />
-                </figure>
-            </div>
-            <div class="card-header">
-                <div class="card-header-title">
-                    <p class="title is-4">{recipe.name}</p>
-                </div>
-                <div class="card-header-icon">
-                    <span class="tag is-warning">{recipe.tag.name}</span>
-                </div>
-            </div>
-            <div class="card-content">
-                <div class="content">
-                    <nav class="level is-mobile">
-                        <div class="level-item has-text-centered">
-                                    <div>
-                                        <p class="title is-5">{recipe.servings}</p>
-                                        <p class="title is-6">SERVINGS</p>
-                                    </div>
-                                </div>
-                                <div class="level-item has-text-centered">
-                                    <div>
-                                        <p class="title is-5">{recipe.calories}</p>
-                                        <p class="title is-6">CALORIES</p>
-                                    </div>
-                                </div>
-                                <div class="level-item has-text-centered">
-                                    <div>
-                                        <p class="title is-5">{recipe.protein}g</p>
-                                        <p class="title is-6">PROTEIN</p>
-                                    </div>
-                                </div>
-                    </nav>
-                    <br />
-                    <div class="columns is-centered">
-                        <div class="column is-narrow">
-                        <span class="title is-6">Ingredients</span>
-                        <br />
-                        <br />
-                        {ingredients}
-                        </div>
-                        <div class="column is-two-thirds">
-                        <span class="title is-6">Instructions</span>
-                        <br />
-                        <br />
-                        {instructions}
-                        </div>
-                    </div>
-                    <br />
-                    <nav class="level">
-                        <div class="level-item">
-                            <button class="button is-primary" id="share-button" onClick="shareRecipe('{recipe.name}')">Share Recipe</button>
-                        </div>
-                    </nav>
-                </div>
-            </div>
-        </div>
-    """
-    return gen_html
\ No newline at end of file
+    return recipe_template.render(recipe=recipe, slug=recipe_slug(recipe), tag_name=reference.tags.name(recipe.tag_id) or "")
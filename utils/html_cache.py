@@ -0,0 +1,161 @@
+import asyncio, os, sys
+from collections import OrderedDict
+from typing import AsyncIterator, Awaitable, Callable
+
+from utils import metrics, versions
+
+# bounded by bytes rather than entries: filtered grids make the keys
+# open-ended, and one unfiltered grid outweighs hundreds of small pages
+HTML_CACHE_MAX_BYTES = int(os.getenv("HTML_CACHE_MAX_BYTES", str(32 * 1024 * 1024)))
+
+# only touched from the event loop, so no locking is needed
+_entries: OrderedDict = OrderedDict()
+# compressed copies of an entry's body, by encoding; dropped with the entry
+_variants: dict[tuple, dict[str, bytes]] = {}
+_inflight: dict[tuple, asyncio.Event] = {}
+_size = 0
+
+cache_bytes = metrics.Gauge("html_cache_bytes", "Memory held by cached fragments and their compressed copies.", lambda: _size)
+cache_entries = metrics.Gauge("html_cache_entries", "Fragments currently cached.", lambda: len(_entries))
+metrics.REGISTRY.extend([cache_bytes, cache_entries])
+
+def make_key(route: str, tables: tuple[str, ...], **params):
+    # the table versions are part of the key, so a write makes every
+    # fragment rendered from the old data unreachable
+    return (route, tuple(sorted(params.items())), versions.current(*tables))
+
+def get(key: tuple):
+    if key in _entries:
+        _entries.move_to_end(key)
+        return _entries[key]
+    return None
+
+def _sizeof(value):
+    # values are fragments, (fragment, cursor) pages or facet counts
+    if isinstance(value, (tuple, list)):
+        return sys.getsizeof(value) + sum(_sizeof(item) for item in value)
+    if isinstance(value, dict):
+        return sys.getsizeof(value) + sum(_sizeof(k) + _sizeof(v) for k, v in value.items())
+    return sys.getsizeof(value)
+
+def _evict(key: tuple):
+    global _size
+    _size -= _sizeof(_entries.pop(key))
+    for data in _variants.pop(key, {}).values():
+        _size -= sys.getsizeof(data)
+
+def _shrink():
+    while _size > HTML_CACHE_MAX_BYTES:
+        _evict(next(iter(_entries)))
+
+def _store(key: tuple, value):
+    global _size
+    if key in _entries:
+        _evict(key)
+    size = _sizeof(value)
+    if size > HTML_CACHE_MAX_BYTES:
+        return
+    _entries[key] = value
+    _size += size
+    _shrink()
+
+def get_variant(key: tuple, encoding: str) -> bytes | None:
+    return _variants.get(key, {}).get(encoding)
+
+def set_variant(key: tuple, encoding: str, data: bytes):
+    global _size
+    if key not in _entries:
+        return
+    variants = _variants.setdefault(key, {})
+    if encoding in variants:
+        _size -= sys.getsizeof(variants[encoding])
+    variants[encoding] = data
+    _size += sys.getsizeof(data)
+    _shrink()
+
+class _Render:
+    """A fragment being rendered, and the chunks it has produced so far."""
+
+    def __init__(self):
+        self.chunks: list[str] = []
+        self.done = False
+        self.error: BaseException | None = None
+        self.changed = asyncio.Event()
+        self.task: asyncio.Task | None = None
+
+    def notify(self):
+        self.changed.set()
+        self.changed = asyncio.Event()
+
+_renders: dict[tuple, _Render] = {}
+
+async def _render_into(key: tuple, job: _Render, render: Callable[[], AsyncIterator[str]]):
+    try:
+        async for chunk in render():
+            job.chunks.append(chunk)
+            job.notify()
+        _store(key, "".join(job.chunks))
+    except Exception as e:
+        job.error = e
+    finally:
+        job.done = True
+        _renders.pop(key, None)
+        job.notify()
+
+async def stream(key: tuple, render: Callable[[], AsyncIterator[str]]) -> AsyncIterator[str]:
+    value = get(key)
+    if value is not None:
+        yield value
+        return
+
+    # the render runs as its own task into a shared buffer, and every
+    # response for the key, the first included, reads from that buffer at
+    # its own pace; a stalled client then holds up nobody but itself
+    job = _renders.get(key)
+    if job is None:
+        job = _renders[key] = _Render()
+        job.task = asyncio.get_running_loop().create_task(_render_into(key, job, render))
+
+    sent = 0
+    while True:
+        while sent < len(job.chunks):
+            yield job.chunks[sent]
+            sent += 1
+        if job.done:
+            if job.error is not None:
+                raise job.error
+            return
+        await job.changed.wait()
+
+async def get_or_render(key: tuple, render: Callable[[], Awaitable]):
+    value = get(key)
+    if value is not None:
+        return value
+
+    event = _inflight.get(key)
+    if event is not None:
+        await event.wait()
+        value = get(key)
+        return value if value is not None else await render()
+
+    event = _inflight[key] = asyncio.Event()
+    try:
+        value = await render()
+        _store(key, value)
+        return value
+    finally:
+        _inflight.pop(key, None)
+        event.set()
+
+def invalidate(*tables: str):
+    # the next request's key has the new versions anyway; this only frees
+    # the entries nothing can hit any more
+    for key in list(_entries):
+        if any(table in tables for table, _ in key[2]):
+            _evict(key)
+
+def clear():
+    global _size
+    _entries.clear()
+    _variants.clear()
+    _size = 0
@@ -0,0 +1,26 @@
+import threading
+from models import recipe as recipe_model
+
+_local = threading.local()
+
+def _converter():
+    converter = getattr(_local, "converter", None)
+    if converter is None:
+        # imported lazily so that only the write path pays for loading markdown
+        import markdown
+        converter = _local.converter = markdown.Markdown(extensions=['tables'])
+    return converter
+
+def render_markdown(string: str | None):
+    if not string:
+        return ""
+    return _converter().reset().convert(string)
+
+def render_recipe_markdown(recipe: recipe_model.Recipe):
+    recipe.ingredients_html = render_markdown(recipe.ingredients)
+    recipe.instructions_html = render_markdown(recipe.instructions)
+
+def render_recipe_markdown_row(row: dict):
+    row["ingredients_html"] = render_markdown(row.get("ingredients"))
+    row["instructions_html"] = render_markdown(row.get("instructions"))
+    return row
@@ -0,0 +1,212 @@
+import os, threading, time
+from functools import wraps
+from inspect import isgeneratorfunction
+from sqlalchemy import event
+
+from utils import profiling
+
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "true").lower() not in ("0", "false", "no")
+# the engine and render hooks also feed the profiler's per-request numbers
+HOOKS_ENABLED = METRICS_ENABLED or profiling.PROFILE_ENABLED
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+class Histogram:
+    def __init__(self, name: str, help: str, labels: tuple[str, ...], buckets: tuple[float, ...] = BUCKETS):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.buckets = buckets
+        self._series: dict[tuple, list] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *label_values):
+        # one count per bucket the value falls in; cumulated when rendered
+        index = 0
+        for bound in self.buckets:
+            if value <= bound:
+                break
+            index += 1
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][index] += 1
+            series[1] += value
+
+    def render(self):
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} histogram"
+        with self._lock:
+            series = [(labels, list(counts), total) for labels, (counts, total) in self._series.items()]
+        for label_values, counts, total in sorted(series):
+            labels = _labels(self.labels, label_values)
+            cumulative = 0
+            for bound, count in zip(self.buckets, counts):
+                cumulative += count
+                yield f'{self.name}_bucket{{{labels}{"," if labels else ""}le="{bound}"}} {cumulative}'
+            cumulative += counts[-1]
+            yield f'{self.name}_bucket{{{labels}{"," if labels else ""}le="+Inf"}} {cumulative}'
+            yield f"{self.name}_sum{{{labels}}} {total}"
+            yield f"{self.name}_count{{{labels}}} {cumulative}"
+
+class Counter:
+    def __init__(self, name: str, help: str, labels: tuple[str, ...]):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self._values: dict[tuple, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *label_values, amount: float = 1):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def render(self):
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} counter"
+        with self._lock:
+            values = sorted(self._values.items())
+        for label_values, value in values:
+            yield f"{self.name}{{{_labels(self.labels, label_values)}}} {value}"
+
+class Gauge:
+    # read when scraped, for values another module already keeps
+    def __init__(self, name: str, help: str, read, type: str = "gauge"):
+        self.name = name
+        self.help = help
+        self.read = read
+        self.type = type
+
+    def render(self):
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} {self.type}"
+        yield f"{self.name} {self.read()}"
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _labels(names: tuple[str, ...], values: tuple):
+    return ",".join(f'{name}="{_escape(value)}"' for name, value in zip(names, values))
+
+requests_total = Counter("http_requests_total", "Requests by route template and status.", ("method", "route", "status"))
+request_errors_total = Counter("http_request_errors_total", "Requests that ended in a 5xx or an exception.", ("method", "route"))
+request_duration = Histogram("http_request_duration_seconds", "Time from request start to the last body chunk.", ("method", "route"))
+request_db_duration = Histogram("http_request_db_seconds", "Time a request spent executing SQL.", ("method", "route"))
+request_render_duration = Histogram("http_request_render_seconds", "Time a request spent in generate_html.", ("method", "route"))
+db_duration = Histogram("db_statement_duration_seconds", "SQL statement execution time by engine.", ("engine",))
+render_duration = Histogram("render_duration_seconds", "generate_html time by function.", ("function",))
+REGISTRY = [requests_total, request_errors_total, request_duration, request_db_duration,
+            request_render_duration, db_duration, render_duration]
+
+def instrument_engine(engine, name: str):
+    if not HOOKS_ENABLED:
+        return
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info["query_start"].pop()
+        db_duration.observe(elapsed, name)
+        # the stats object is mutated, not the variable set, so this works
+        # from the greenlet SQLAlchemy runs async statements in
+        stats = profiling.request_stats.get()
+        if stats is not None:
+            stats.add_statement(statement, elapsed)
+
+    @event.listens_for(engine, "handle_error")
+    def handle_error(exception_context):
+        starts = exception_context.connection and exception_context.connection.info.get("query_start")
+        if starts:
+            starts.pop()
+
+def _add_render(seconds: float):
+    stats = profiling.request_stats.get()
+    if stats is not None:
+        stats.render += seconds
+
+def timed_render(func):
+    if not HOOKS_ENABLED:
+        return func
+    name = func.__name__
+
+    if isgeneratorfunction(func):
+        # the grids are consumed card by card while streaming, so only the
+        # time spent inside the generator counts, not the waits between
+        @wraps(func)
+        def generator(*args, **kwargs):
+            iterator = func(*args, **kwargs)
+            elapsed = 0.0
+            try:
+                while True:
+                    start = time.perf_counter()
+                    try:
+                        item = next(iterator)
+                    finally:
+                        step = time.perf_counter() - start
+                        elapsed += step
+                        _add_render(step)
+                    yield item
+            except StopIteration:
+                return
+            finally:
+                render_duration.observe(elapsed, name)
+        return generator
+
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            elapsed = time.perf_counter() - start
+            render_duration.observe(elapsed, name)
+            _add_render(elapsed)
+    return wrapper
+
+def render():
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+class MetricsMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = profiling.RequestStats()
+        token = profiling.request_stats.set(stats)
+        status = 500
+        start = time.perf_counter()
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        except Exception:
+            status = 500
+            raise
+        finally:
+            elapsed = time.perf_counter() - start
+            profiling.request_stats.reset(token)
+            # the template, not the raw path, so ids don't explode the series
+            route = scope.get("route")
+            path = route.path if route is not None else "unmatched"
+            method = scope["method"]
+            requests_total.inc(method, path, status)
+            if status >= 500:
+                request_errors_total.inc(method, path)
+            request_duration.observe(elapsed, method, path)
+            request_db_duration.observe(stats.db, method, path)
+            request_render_duration.observe(stats.render, method, path)
@@ -0,0 +1,100 @@
+import asyncio, multiprocessing, os
+from concurrent.futures import ProcessPoolExecutor
+from typing import AsyncIterator, Awaitable, Callable
+from fastapi import Request
+from fastapi.concurrency import run_in_threadpool
+from pydantic import ValidationError
+from sqlalchemy import insert
+from sqlmodel import SQLModel
+
+from utils import pagination
+
+IMPORT_BATCH_SIZE = 1000
+MAX_REPORTED_ERRORS = 1000
+IMPORT_WORKERS = int(os.getenv("IMPORT_WORKERS", str(os.cpu_count() or 1)))
+
+_prepare_pool = None
+
+def _prepare_rows(prepare: Callable[[dict], dict], rows: list[dict]):
+    return [prepare(row) for row in rows]
+
+async def prepare_rows(prepare: Callable[[dict], dict], rows: list[dict]):
+    global _prepare_pool
+    if IMPORT_WORKERS <= 1:
+        return await run_in_threadpool(_prepare_rows, prepare, rows)
+    if _prepare_pool is None:
+        # created on the first import so ordinary workers never start one;
+        # forkserver, since a child forked from this threaded process can
+        # inherit a lock some threadpool thread held and deadlock on it
+        _prepare_pool = ProcessPoolExecutor(
+            max_workers=IMPORT_WORKERS,
+            mp_context=multiprocessing.get_context("forkserver"),
+        )
+    # split the batch so every worker process gets a share of it
+    size = -(-len(rows) // IMPORT_WORKERS)
+    loop = asyncio.get_running_loop()
+    parts = await asyncio.gather(*(
+        loop.run_in_executor(_prepare_pool, _prepare_rows, prepare, rows[i:i + size])
+        for i in range(0, len(rows), size)
+    ))
+    return [row for part in parts for row in part]
+
+async def iter_lines(request: Request) -> AsyncIterator[tuple[int, bytes]]:
+    buffer = b""
+    line_number = 0
+    async for chunk in request.stream():
+        buffer += chunk
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            line_number += 1
+            yield line_number, line
+    if buffer:
+        yield line_number + 1, buffer
+
+async def import_rows(
+    session,
+    request: Request,
+    create_model: type[SQLModel],
+    table_model: type[SQLModel],
+    prepare: Callable[[dict], dict] | None = None,
+    before_insert: Callable[[list[dict]], Awaitable[list[dict]]] | None = None,
+):
+    inserted, failed, errors, batch = 0, 0, [], []
+
+    async def flush():
+        rows = batch
+        if prepare:
+            rows = await prepare_rows(prepare, rows)
+        if before_insert:
+            # runs in the request, for work that needs the session
+            rows = await before_insert(rows)
+        # one executemany and one commit per batch instead of per row
+        await session.execute(insert(table_model), rows)
+        await session.commit()
+        return len(rows)
+
+    async for line_number, line in iter_lines(request):
+        if not line.strip():
+            continue
+        try:
+            row = create_model.model_validate_json(line)
+        except ValidationError as e:
+            failed += 1
+            if len(errors) < MAX_REPORTED_ERRORS:
+                errors.append({
+                    "line": line_number,
+                    "errors": e.errors(include_url=False, include_context=False, include_input=False),
+                })
+            continue
+        batch.append(row.model_dump())
+        if len(batch) >= IMPORT_BATCH_SIZE:
+            inserted += await flush()
+            batch = []
+    if batch:
+        inserted += await flush()
+
+    return {"inserted": inserted, "failed": failed, "errors": errors}
+
+async def export_rows(new_session, statement, sort: list, export_model: type[SQLModel], batch_size: int = 500):
+    async for rows in pagination.iter_pages(new_session, statement, sort, batch_size):
+        yield "".join(export_model.model_validate(row).model_dump_json() + "\n" for row in rows)
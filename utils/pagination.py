@@ -0,0 +1,103 @@
+import base64, json
+from fastapi import HTTPException
+from sqlalchemy import and_
+
+# SQLite integers are signed 64-bit; anything outside fails in the driver
+INT64_MIN, INT64_MAX = -2**63, 2**63 - 1
+
+# a sort order is a list of (column, descending) pairs that must end in a
+# unique column, so every row has exactly one position in it
+
+def sort_key(sort: list) -> str:
+    return ",".join(("-" if descending else "") + column.key for column, descending in sort)
+
+def encode_cursor(values: list, sort: list) -> str:
+    # the sort travels with the values: replayed under another order, the
+    # same values would silently seek to the wrong place
+    data = json.dumps([sort_key(sort), *values], separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode("ascii")
+
+def decode_cursor(cursor: str, sort: list) -> list:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail="Invalid cursor") from e
+    if not isinstance(values, list) or len(values) != len(sort) + 1:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    key, *values = values
+    if key != sort_key(sort):
+        raise HTTPException(status_code=400, detail="Cursor belongs to a different sort order")
+    # the values are bound straight into the seek; a list or object there,
+    # or an int SQLite can't hold, would fail inside the driver instead of here
+    for value in values:
+        if not (value is None or isinstance(value, (str, int, float, bool))):
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+        if isinstance(value, int) and not INT64_MIN <= value <= INT64_MAX:
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+    return values
+
+def order_by(sort: list):
+    return [column.desc() if descending else column for column, descending in sort]
+
+def _equal(column, value):
+    return column.is_(None) if value is None else column == value
+
+def _nullable(column):
+    return column.expression.nullable
+
+def _beyond(column, descending: bool, value):
+    # the rows past value in this one column, as ranges in sort order;
+    # SQLite sorts NULL below every value: first ascending, last descending
+    if isinstance(value, bool):
+        # SQLAlchemy refuses < and > against True/False; SQLite stores 0/1
+        value = int(value)
+    if descending:
+        if value is None:
+            return []
+        return [column < value] + ([column.is_(None)] if _nullable(column) else [])
+    return [column.is_not(None) if value is None else column > value]
+
+def seeks(sort: list, values: list):
+    """The rows after values in sort order, as predicates to run in turn.
+
+    (a, b, c) > (x, y, z) spelled out as one OR can't seek an index, so a
+    deep page would walk every row before it. Each predicate here is an
+    equality prefix and one range, which SQLite can SEARCH, and they are
+    listed nearest first, so their results concatenate in sort order.
+    """
+    predicates = []
+    for i in reversed(range(len(sort))):
+        column, descending = sort[i]
+        prefix = [_equal(sort[j][0], values[j]) for j in range(i)]
+        predicates.extend(and_(*prefix, clause) for clause in _beyond(column, descending, values[i]))
+    return predicates
+
+def cursor_for(row, sort: list) -> str:
+    return encode_cursor([getattr(row, column.key) for column, _ in sort], sort)
+
+async def fetch_page(session, statement, sort: list, cursor: str | None, limit: int):
+    statement = statement.order_by(*order_by(sort))
+    if cursor:
+        rows = []
+        for predicate in seeks(sort, decode_cursor(cursor, sort)):
+            # one extra row tells us whether there is another page
+            rows.extend((await session.exec(statement.where(predicate).limit(limit + 1 - len(rows)))).all())
+            if len(rows) > limit:
+                break
+    else:
+        rows = (await session.exec(statement.limit(limit + 1))).all()
+    if len(rows) > limit:
+        return rows[:limit], cursor_for(rows[limit - 1], sort)
+    return rows, None
+
+async def iter_pages(new_session, statement, sort: list, batch_size: int):
+    # one short session per page, so a slow client holds no pooled
+    # connection between chunks; each page is a keyset seek, not an offset
+    cursor = None
+    while True:
+        async with new_session() as session:
+            rows, cursor = await fetch_page(session, statement, sort, cursor, batch_size)
+        yield rows
+        if cursor is None:
+            return
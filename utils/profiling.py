@@ -0,0 +1,144 @@
+import logging, os, random, sys, time
+from contextvars import ContextVar
+from functools import wraps
+from inspect import iscoroutinefunction
+from fastapi.routing import APIRoute
+from starlette.datastructures import MutableHeaders
+
+PROFILE_ENABLED = os.getenv("PROFILE_ENABLED", "false").lower() in ("1", "true", "yes")
+# fraction of requests profiled, so one production worker can run with it on
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "1.0"))
+# a statement repeated more often than this in one request is logged as a likely N+1
+PROFILE_REPEAT_THRESHOLD = int(os.getenv("PROFILE_REPEAT_THRESHOLD", "10"))
+# distinct statements kept per request; repeats of kept ones are still counted
+PROFILE_MAX_STATEMENTS = int(os.getenv("PROFILE_MAX_STATEMENTS", "200"))
+PROFILE_STATEMENT_CHARS = 300
+
+logger = logging.getLogger(__name__)
+if PROFILE_ENABLED and not logger.handlers:
+    handler = logging.StreamHandler(sys.stderr)
+    handler.setFormatter(logging.Formatter("%(levelname)s:  %(message)s"))
+    logger.addHandler(handler)
+    logger.setLevel(logging.INFO)
+
+class RequestStats:
+    """Time spent per phase by the request being handled.
+
+    Filled in by the engine and render hooks in utils.metrics. statements
+    is only collected for requests picked for profiling.
+    """
+    __slots__ = ("db", "render", "endpoint_end", "work_at_endpoint_end", "statements", "dropped")
+
+    def __init__(self):
+        self.db = 0.0
+        self.render = 0.0
+        self.endpoint_end = None
+        self.work_at_endpoint_end = 0.0
+        self.statements: dict[str, list] | None = None
+        self.dropped = 0
+
+    def end_endpoint(self):
+        self.endpoint_end = time.perf_counter()
+        self.work_at_endpoint_end = self.db + self.render
+
+    def add_statement(self, statement: str, seconds: float):
+        self.db += seconds
+        if self.statements is None:
+            return
+        entry = self.statements.get(statement)
+        if entry is None:
+            if len(self.statements) >= PROFILE_MAX_STATEMENTS:
+                self.dropped += 1
+                return
+            entry = self.statements[statement] = [0, 0.0]
+        entry[0] += 1
+        entry[1] += seconds
+
+request_stats: ContextVar[RequestStats | None] = ContextVar("request_stats", default=None)
+
+def _mark_endpoint_end(endpoint):
+    # everything between the endpoint returning and the response starting
+    # is FastAPI validating and encoding the return value
+    if iscoroutinefunction(endpoint):
+        @wraps(endpoint)
+        async def timed(*args, **kwargs):
+            try:
+                return await endpoint(*args, **kwargs)
+            finally:
+                stats = request_stats.get()
+                if stats is not None:
+                    stats.end_endpoint()
+        return timed
+
+    @wraps(endpoint)
+    def timed(*args, **kwargs):
+        try:
+            return endpoint(*args, **kwargs)
+        finally:
+            stats = request_stats.get()
+            if stats is not None:
+                stats.end_endpoint()
+    return timed
+
+class ProfiledRoute(APIRoute):
+    def __init__(self, path: str, endpoint, **kwargs):
+        super().__init__(path, _mark_endpoint_end(endpoint), **kwargs)
+
+route_class = ProfiledRoute if PROFILE_ENABLED else APIRoute
+
+def server_timing(stats: RequestStats, start: float, now: float):
+    serialize = 0.0
+    if stats.endpoint_end is not None:
+        # a streamed body queries and renders after the endpoint returns
+        serialize = now - stats.endpoint_end - (stats.db + stats.render - stats.work_at_endpoint_end)
+    phases = (("db", stats.db), ("render", stats.render), ("serialize", serialize), ("total", now - start))
+    return ", ".join(f"{name};dur={seconds * 1000:.2f}" for name, seconds in phases)
+
+def log_request(scope, status: int, stats: RequestStats, elapsed: float):
+    route = scope.get("route")
+    name = f'{scope["method"]} {route.path if route is not None else scope["path"]}'
+    executed = sum(count for count, _ in stats.statements.values())
+    logger.info("%s %s %.2fms db=%.2fms render=%.2fms statements=%d distinct=%d dropped=%d",
+                name, status, elapsed * 1000, stats.db * 1000, stats.render * 1000,
+                executed, len(stats.statements), stats.dropped)
+    for statement, (count, seconds) in sorted(stats.statements.items(), key=lambda item: -item[1][1]):
+        text = " ".join(statement.split())[:PROFILE_STATEMENT_CHARS]
+        logger.info("  %4dx %8.2fms  %s", count, seconds * 1000, text)
+        if count > PROFILE_REPEAT_THRESHOLD:
+            logger.warning("possible N+1 in %s: statement ran %d times: %s", name, count, text)
+
+class ProfilingMiddleware:
+    def __init__(self, app, sample_rate: float = PROFILE_SAMPLE_RATE):
+        self.app = app
+        self.sample_rate = sample_rate
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or random.random() >= self.sample_rate:
+            await self.app(scope, receive, send)
+            return
+
+        # shared with the metrics middleware when that runs outside this one
+        stats = request_stats.get()
+        token = None
+        if stats is None:
+            stats = RequestStats()
+            token = request_stats.set(stats)
+        stats.statements = {}
+        status = 500
+        start = time.perf_counter()
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                # streamed bodies keep rendering after this, the log has the full numbers
+                headers = MutableHeaders(raw=message["headers"])
+                headers.append("Server-Timing", server_timing(stats, start, time.perf_counter()))
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            if token is not None:
+                request_stats.reset(token)
+            log_request(scope, status, stats, time.perf_counter() - start)
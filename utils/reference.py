@@ -0,0 +1,80 @@
+from sqlmodel import SQLModel, select
+
+from models import (
+    tag as tag_model,
+    cuisine as cuisine_model
+)
+
+class Names:
+    """A table's id -> name map, kept whole in memory.
+
+    Only for small tables that change rarely: every read is a dict lookup,
+    and every write rebuilds the ordered list the option endpoints return.
+    """
+
+    def __init__(self, table, public: type[SQLModel], order):
+        self.table = table
+        self.public = public
+        self.order = order
+        self._names: dict[int, str] = {}
+        self._dicts: dict[int, dict] = {}
+        self._items: list[dict] = []
+
+    def statement(self):
+        return select(self.table.id, self.table.name)
+
+    def set_all(self, rows):
+        self._names = {row_id: name for row_id, name in rows}
+        self._rebuild()
+
+    def add(self, row_id: int, name: str):
+        self._names[row_id] = name
+        self._rebuild()
+
+    def remove(self, row_id: int):
+        self._names.pop(row_id, None)
+        self._rebuild()
+
+    def _rebuild(self):
+        # shaped like the public model, in its field order, so they encode
+        # to the same JSON the response_model would
+        fields = list(self.public.model_fields)
+        self._dicts = {
+            row_id: {field: {"id": row_id, "name": name}[field] for field in fields}
+            for row_id, name in self._names.items()
+        }
+        self._items = sorted(self._dicts.values(), key=self.order)
+
+    def name(self, row_id: int | None) -> str | None:
+        return self._names.get(row_id)
+
+    def public_dict(self, row_id: int | None) -> dict | None:
+        return self._dicts.get(row_id)
+
+    def items(self) -> list[dict]:
+        return self._items
+
+    def page(self, offset: int, limit: int) -> list[dict]:
+        # OFFSET and LIMIT as SQLite reads them: a negative limit is no limit
+        items = self._items[max(offset, 0):]
+        return items if limit < 0 else items[:limit]
+
+# the orders the option endpoints have always used
+tags = Names(tag_model.Tag, tag_model.TagPublic, order=lambda item: item["id"])
+cuisines = Names(cuisine_model.Cuisine, cuisine_model.CuisinePublic, order=lambda item: (item["name"], item["id"]))
+
+async def load(session):
+    for names in (tags, cuisines):
+        names.set_all((await session.exec(names.statement())).all())
+
+def load_sync(session):
+    for names in (tags, cuisines):
+        names.set_all(session.exec(names.statement()).all())
+
+def reload(conn, tables):
+    # from a plain sqlite3 connection, for the tables whose rows changed
+    # under another process
+    for names in (tags, cuisines):
+        name = names.table.__tablename__
+        if name in tables:
+            names.set_all(conn.execute(f"SELECT id, name FROM {name}").fetchall())
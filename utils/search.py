@@ -0,0 +1,89 @@
+import re
+from sqlalchemy import Float, Integer, text
+from sqlalchemy.orm import joinedload
+from sqlmodel import select
+
+from models import (
+    recipe as recipe_model,
+    review as review_model
+)
+
+# table -> (indexed columns, bm25 weight per column)
+FTS_TABLES = {
+    "recipe": (("name", "ingredients", "instructions"), (10.0, 2.0, 1.0)),
+    "review": (("name", "address", "notes"), (10.0, 2.0, 1.0)),
+}
+
+def _fts_ddl(table: str, columns: tuple[str, ...]):
+    fts = f"{table}_fts"
+    names = ", ".join(columns)
+    new_values = ", ".join(f"new.{column}" for column in columns)
+    old_values = ", ".join(f"old.{column}" for column in columns)
+    return [
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {fts} USING fts5({names}, content='{table}', content_rowid='id')",
+        f"""CREATE TRIGGER IF NOT EXISTS {fts}_ai AFTER INSERT ON {table} BEGIN
+            INSERT INTO {fts}(rowid, {names}) VALUES (new.id, {new_values});
+        END""",
+        f"""CREATE TRIGGER IF NOT EXISTS {fts}_ad AFTER DELETE ON {table} BEGIN
+            INSERT INTO {fts}({fts}, rowid, {names}) VALUES ('delete', old.id, {old_values});
+        END""",
+        f"""CREATE TRIGGER IF NOT EXISTS {fts}_au AFTER UPDATE OF {names} ON {table} BEGIN
+            INSERT INTO {fts}({fts}, rowid, {names}) VALUES ('delete', old.id, {old_values});
+            INSERT INTO {fts}(rowid, {names}) VALUES (new.id, {new_values});
+        END""",
+    ]
+
+def create_search_tables(conn):
+    for table, (columns, _) in FTS_TABLES.items():
+        fts = f"{table}_fts"
+        exists = conn.exec_driver_sql(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (fts,)
+        ).first()
+        for statement in _fts_ddl(table, columns):
+            conn.exec_driver_sql(statement)
+        if not exists:
+            # index the rows written before the triggers existed
+            conn.exec_driver_sql(f"INSERT INTO {fts}({fts}) VALUES ('rebuild')")
+
+def to_match_query(q: str):
+    # every word becomes a quoted prefix term, so user input can never be
+    # parsed as FTS5 syntax; the terms are ANDed together
+    terms = re.findall(r"\w+", q)
+    return " ".join(f'"{term}"*' for term in terms)
+
+def _ranked_ids(table: str, query: str, limit: int):
+    fts = f"{table}_fts"
+    weights = ", ".join(str(weight) for weight in FTS_TABLES[table][1])
+    return (
+        text(
+            f"SELECT rowid, bm25({fts}, {weights}) AS rank FROM {fts} "
+            f"WHERE {fts} MATCH :query ORDER BY rank LIMIT :limit"
+        )
+        .bindparams(query=query, limit=limit)
+        .columns(rowid=Integer, rank=Float)
+        .subquery()
+    )
+
+def search_recipes(q: str, limit: int):
+    query = to_match_query(q)
+    if not query:
+        return None
+    ranked = _ranked_ids("recipe", query, limit)
+    return (
+        select(recipe_model.Recipe)
+        .options(joinedload(recipe_model.Recipe.tag))
+        .join(ranked, recipe_model.Recipe.id == ranked.c.rowid)
+        .order_by(ranked.c.rank)
+    )
+
+def search_reviews(q: str, limit: int):
+    query = to_match_query(q)
+    if not query:
+        return None
+    ranked = _ranked_ids("review", query, limit)
+    return (
+        select(review_model.Review)
+        .options(joinedload(review_model.Review.cuisine))
+        .join(ranked, review_model.Review.id == ranked.c.rowid)
+        .order_by(ranked.c.rank)
+    )
@@ -0,0 +1,45 @@
+from sqlmodel import SQLModel, select
+
+from models import (
+    recipe as recipe_model,
+    review as review_model
+)
+from utils import reference
+
+class NestedList:
+    """Select and shape rows as `public` plus one nested related item.
+
+    The columns come from the public model, in its field order, and the
+    nested item is looked up in a reference.Names map, so the dicts built
+    here serialize to the same JSON the response_model would, without a
+    join, ORM objects or validating them again.
+    """
+
+    def __init__(self, table, public: type[SQLModel], related: reference.Names, key: str, foreign_key):
+        self.names = list(public.model_fields)
+        self.key = key
+        self.columns = [getattr(table, name) for name in self.names]
+        self.related = related
+        self.foreign_key = foreign_key
+
+    def select(self):
+        return select(*self.columns, self.foreign_key)
+
+    def dicts(self, rows):
+        split = len(self.names)
+        lookup = self.related.public_dict
+        items = []
+        for row in rows:
+            item = dict(zip(self.names, row[:split]))
+            item[self.key] = lookup(row[split])
+            items.append(item)
+        return items
+
+recipes_with_tag = NestedList(
+    recipe_model.Recipe, recipe_model.RecipePublic,
+    reference.tags, "tag", recipe_model.Recipe.tag_id,
+)
+reviews_with_cuisine = NestedList(
+    review_model.Review, review_model.ReviewPublic,
+    reference.cuisines, "cuisine", review_model.Review.cuisine_id,
+)
@@ -0,0 +1,57 @@
+import re
+from sqlmodel import select
+
+_UNSAFE = re.compile(r'[^a-z0-9\s-]')
+_SEPARATORS = re.compile(r'[\s-]+')
+
+def slugify(string: str):
+    string = _UNSAFE.sub('', string.lower())
+    return _SEPARATORS.sub('-', string).strip('-')
+
+def base_slug(name: str, fallback: str):
+    # a name with nothing sluggable in it still needs a URL
+    return slugify(name) or fallback
+
+def next_free(base: str, taken: set[str]):
+    if base not in taken:
+        return base
+    number = 2
+    while f"{base}-{number}" in taken:
+        number += 1
+    return f"{base}-{number}"
+
+def _taken_statement(table, base: str, exclude_id: int | None = None):
+    # base and base-*, as one range on the slug index: slugs are only
+    # [a-z0-9-] and "." sorts right after "-". LIKE 'base-%' can't use the
+    # index under SQLite's case-insensitive LIKE, so it scanned per base
+    statement = select(table.slug).where(table.slug >= base, table.slug < f"{base}.")
+    if exclude_id is not None:
+        statement = statement.where(table.id != exclude_id)
+    return statement
+
+async def unique_slug(session, table, name: str, exclude_id: int | None = None):
+    base = base_slug(name, table.__tablename__)
+    taken = set((await session.exec(_taken_statement(table, base, exclude_id))).all())
+    return next_free(base, taken)
+
+async def assign_slugs(session, table, rows: list[dict]):
+    # one lookup per distinct base, shared by every row in the batch with it
+    taken: dict[str, set[str]] = {}
+    for row in rows:
+        base = base_slug(row["name"], table.__tablename__)
+        if base not in taken:
+            taken[base] = set((await session.exec(_taken_statement(table, base))).all())
+        row["slug"] = next_free(base, taken[base])
+        taken[base].add(row["slug"])
+    return rows
+
+def backfill(conn, table: str):
+    """Give every row of table a unique slug, oldest rows first."""
+    taken: set[str] = set()
+    updates = []
+    for row_id, name in conn.exec_driver_sql(f"SELECT id, name FROM {table} ORDER BY id"):
+        slug = next_free(base_slug(name, table), taken)
+        taken.add(slug)
+        updates.append({"slug": slug, "id": row_id})
+    if updates:
+        conn.exec_driver_sql(f"UPDATE {table} SET slug = :slug WHERE id = :id", updates)
@@ -0,0 +1,68 @@
+import math, sqlite3, threading, time
+
+import db_config
+from utils import changes, reference
+
+# the table versions come from the change log, which the triggers write in
+# the same transaction as every change to these tables, whichever process
+# or script makes it; a version is (newest log id for the table, horizon),
+# the horizon because compaction can drop a table's newest entry
+BOOT_TIME = math.ceil(time.time())
+STATE_SQL = "SELECT " + ", ".join(
+    [f"(SELECT MAX(id) FROM change WHERE entity = '{table}')" for table in changes.TABLES]
+    + ["(SELECT horizon FROM change_horizon WHERE id = 1)"]
+)
+
+_versions: dict[str, tuple[int, int]] = {}
+_modified: dict[str, int] = {}
+_lock = threading.Lock()
+_connection: sqlite3.Connection | None = None
+_data_version: int | None = None
+
+def _connect():
+    global _connection
+    if _connection is None:
+        # a connection of its own, outside the pools: PRAGMA data_version
+        # only moves for commits made by other connections, which is then
+        # every writer there is
+        _connection = sqlite3.connect(db_config.DATABASE_FILE, check_same_thread=False, isolation_level=None)
+        for pragma in db_config.connection_pragmas(readonly=True):
+            _connection.execute(pragma)
+    return _connection
+
+def refresh():
+    """Bring the table versions up to date with the database.
+
+    Costs one PRAGMA when nothing was committed since the last call, so it
+    runs on every request; the log is only read when something changed.
+    """
+    global _data_version
+    with _lock:
+        conn = _connect()
+        data_version = conn.execute("PRAGMA data_version").fetchone()[0]
+        if data_version == _data_version:
+            return
+        *newest, horizon = conn.execute(STATE_SQL).fetchone()
+        moved = []
+        for table, seq in zip(changes.TABLES, newest):
+            version = (seq or 0, horizon)
+            if _versions.get(table) != version:
+                _versions[table] = version
+                moved.append(table)
+                # Last-Modified only has second precision, so every change
+                # moves it forward by at least a second to keep
+                # If-Modified-Since honest
+                previous = _modified.get(table, BOOT_TIME)
+                _modified[table] = max(previous + 1, math.ceil(time.time()))
+        # the names other processes added or removed
+        reference.reload(conn, moved)
+        _data_version = data_version
+
+def current(*tables: str) -> tuple[tuple[str, tuple[int, int]], ...]:
+    refresh()
+    with _lock:
+        return tuple((table, _versions.get(table, (0, 0))) for table in tables)
+
+def last_modified(*tables: str) -> int:
+    with _lock:
+        return max((_modified.get(table, BOOT_TIME) for table in tables), default=BOOT_TIME)